@@ -6,6 +6,9 @@ from __future__ import absolute_import
 import logging
 
 from .version import version_info, __version__
+from .async_client import AsyncServer, AsyncDatabase
+from .batch import BatchWriter
+from .cache import DocumentCache, ViewCache
 from .changes import ChangesStream
 from .client import Server, Database, ViewResults, View, TempView
 from .consumer import Consumer
@@ -14,7 +17,7 @@ from .exceptions import (
     InvalidAttachment, DuplicatePropertyError, BadValueError,
     MultipleResultsFound, NoResultFound, ReservedWordError,
     DocsPathNotFound, BulkSaveError, ResourceNotFound, ResourceConflict,
-    PreconditionFailed
+    PreconditionFailed, ResultTimeout, RequestAborted
 )
 from .external import External
 from .loaders import BaseDocsLoader, FileSystemDocsLoader
@@ -26,7 +29,7 @@ from .schema import (
     dict_to_python, DocumentSchema, DocumentBase, Document, StaticDocument,
     QueryMixin, AttachmentMixin, SchemaProperty, SchemaListProperty,
     SchemaDictProperty, ListProperty, DictProperty, StringListProperty,
-    contain, StringProperty, SetProperty
+    contain, StringProperty, SetProperty, CompactDocument
 )
 
 
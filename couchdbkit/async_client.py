@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -
+#
+# This file is part of couchdbkit released under the MIT license.
+# See the NOTICE for more information.
+
+"""
+Non blocking client. Each operation is executed by a pool of workers and
+returns a `couchdbkit.workers.Future`::
+
+    from couchdbkit.async_client import AsyncServer
+
+    s = AsyncServer(max_workers=32)
+    db = s.get_db("testdb")
+
+    futures = [db.open_doc(docid) for docid in ids]
+    docs = [f.result() for f in futures]
+
+    db.save_doc({"type": "event"}).add_done_callback(on_saved)
+
+    # rows and changes are read in the background while you iterate
+    for row in db.view("test/all", stream=True):
+        print row
+
+Operations are executed by the synchronous `Server` and `Database`, so
+params encoding, docid escaping, errors and schema wrapping are the same.
+Workers are threads sharing the connection pool of the server. When the
+process is monkey patched by gevent or eventlet they are green threads,
+so thousands of operations can be kept in flight with a large
+`max_workers`.
+"""
+
+from __future__ import absolute_import
+
+from .changes import ChangesStream
+from .client import Server, Database, DEFAULT_PAGE_SIZE
+from .workers import (
+    DEFAULT_MAX_PENDING, DEFAULT_MAX_WORKERS, Executor, iter_in_background
+)
+
+__all__ = ['AsyncServer', 'AsyncDatabase', 'AsyncViewResults',
+        'AsyncChangesStream']
+
+
+class AsyncServer(object):
+    """ non blocking counterpart of `couchdbkit.client.Server` """
+
+    def __init__(self, uri=None, executor=None,
+            max_workers=DEFAULT_MAX_WORKERS, **params):
+        """ Constructor for AsyncServer
+
+        @param uri: uri of CouchDb host or a `Server` instance. Default
+        is the default uri of `Server`.
+        @param executor: `couchdbkit.workers.Executor` instance, shared
+        by the databases of this server. A new one is created if None.
+        @param max_workers: int, number of workers of the new executor
+        @param params: params passed to `Server`
+        """
+        if isinstance(uri, Server):
+            self.server = uri
+        elif uri is None:
+            self.server = Server(**params)
+        else:
+            self.server = Server(uri, **params)
+
+        if executor is None:
+            executor = Executor(max_workers=max_workers)
+        self.executor = executor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def close(self, wait=True):
+        """ stop the workers once the pending operations are done """
+        self.executor.shutdown(wait=wait)
+
+    def submit(self, fn, *args, **kwargs):
+        """ execute any call in the workers and return a future """
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def info(self):
+        return self.submit(self.server.info)
+
+    def all_dbs(self):
+        return self.submit(self.server.all_dbs)
+
+    def uuids(self, count=1):
+        return self.submit(self.server.uuids, count=count)
+
+    def get_db(self, dbname, **params):
+        """ return an `AsyncDatabase`. No request is sent. """
+        return AsyncDatabase(self.server.get_db(dbname, **params),
+                executor=self.executor)
+
+    def create_db(self, dbname, **params):
+        """ create a database. The result of the future is an
+        `AsyncDatabase` """
+        def create():
+            return AsyncDatabase(self.server.create_db(dbname, **params),
+                    executor=self.executor)
+        return self.submit(create)
+    get_or_create_db = create_db
+
+    def delete_db(self, dbname):
+        return self.submit(self.server.delete_db, dbname)
+
+    def replicate(self, source, target, **params):
+        return self.submit(self.server.replicate, source, target, **params)
+
+    def __getitem__(self, dbname):
+        return self.get_db(dbname)
+
+
+class AsyncDatabase(object):
+    """ non blocking counterpart of `couchdbkit.client.Database`. Methods
+    take the same arguments and return futures of their results. """
+
+    def __init__(self, db, executor=None, max_workers=DEFAULT_MAX_WORKERS):
+        """ Constructor for AsyncDatabase
+
+        @param db: `Database` instance or database uri
+        @param executor: `couchdbkit.workers.Executor` instance
+        @param max_workers: int, number of workers of the executor
+        created if `executor` is None
+        """
+        if not isinstance(db, Database):
+            db = Database(db)
+        self.db = db
+
+        if executor is None:
+            executor = Executor(max_workers=max_workers)
+        self.executor = executor
+
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__, self.db.dbname)
+
+    def submit(self, fn, *args, **kwargs):
+        """ execute any call in the workers and return a future """
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def info(self):
+        return self.submit(self.db.info)
+
+    def doc_exist(self, docid):
+        return self.submit(self.db.doc_exist, docid)
+
+    def open_doc(self, docid, **params):
+        return self.submit(self.db.open_doc, docid, **params)
+    get = open_doc
+
+    def open_docs(self, ids, **params):
+        return self.submit(self.db.open_docs, ids, **params)
+
+    def get_rev(self, docid):
+        return self.submit(self.db.get_rev, docid)
+
+    def save_doc(self, doc, **params):
+        return self.submit(self.db.save_doc, doc, **params)
+
+    def save_docs(self, docs, **params):
+        return self.submit(self.db.save_docs, docs, **params)
+    bulk_save = save_docs
+
+    def delete_doc(self, doc, **params):
+        return self.submit(self.db.delete_doc, doc, **params)
+
+    def delete_docs(self, docs, **params):
+        return self.submit(self.db.delete_docs, docs, **params)
+    bulk_delete = delete_docs
+
+    def copy_doc(self, doc, dest=None, headers=None):
+        return self.submit(self.db.copy_doc, doc, dest=dest, headers=headers)
+
+    def put_attachment(self, doc, content, **params):
+        return self.submit(self.db.put_attachment, doc, content, **params)
+
+    def delete_attachment(self, doc, name, headers=None):
+        return self.submit(self.db.delete_attachment, doc, name,
+                headers=headers)
+
+    def fetch_attachment(self, id_or_doc, name, headers=None):
+        return self.submit(self.db.fetch_attachment, id_or_doc, name,
+                headers=headers)
+
+    def view(self, view_name, schema=None, wrapper=None, **params):
+        """ return an `AsyncViewResults`. No request is sent. """
+        return AsyncViewResults(self.db.view(view_name, schema=schema,
+            wrapper=wrapper, **params), self.executor)
+
+    def all_docs(self, by_seq=False, **params):
+        return AsyncViewResults(self.db.all_docs(by_seq=by_seq, **params),
+                self.executor)
+
+    def changes(self, **params):
+        """ return an `AsyncChangesStream`. See `ChangesStream` """
+        return AsyncChangesStream(self.db, self.executor, **params)
+
+
+class AsyncViewResults(object):
+    """ non blocking counterpart of `couchdbkit.client.ViewResults`.
+    Iterating over it reads the rows in a background thread, ahead of
+    the consumer. """
+
+    def __init__(self, results, executor, max_pending=DEFAULT_MAX_PENDING):
+        self.results = results
+        self.executor = executor
+        self.max_pending = max_pending
+
+    def fetch(self):
+        """ fetch and cache the results. The result of the future is
+        this object. """
+        def fetch():
+            self.results.fetch()
+            return self
+        return self.executor.submit(fetch)
+
+    def all(self):
+        return self.executor.submit(self.results.all)
+
+    def first(self):
+        return self.executor.submit(self.results.first)
+
+    def one(self, except_all=False):
+        return self.executor.submit(self.results.one, except_all=except_all)
+
+    def exists(self):
+        return self.executor.submit(self.results.exists)
+
+    def count(self):
+        return self.executor.submit(self.results.count)
+
+    def each(self, callback):
+        """ call `callback` with each row. The result of the future is the
+        number of rows. """
+        def each():
+            count = 0
+            for row in self.results:
+                callback(row)
+                count += 1
+            return count
+        return self.executor.submit(each)
+
+    def paginate(self, page_size=DEFAULT_PAGE_SIZE):
+        """ iterate over all the rows, fetched by pages of `page_size`
+        rows in the background. See `ViewResults.paginate`. """
+        return iter_in_background(self.results.paginate(page_size),
+                self.max_pending)
+
+    def __iter__(self):
+        return iter_in_background(self.results, self.max_pending)
+
+
+class AsyncChangesStream(object):
+    """ non blocking counterpart of `couchdbkit.changes.ChangesStream`.
+    Iterating over it reads the changes in a background thread. """
+
+    def __init__(self, db, executor, max_pending=DEFAULT_MAX_PENDING,
+            **params):
+        self.stream = ChangesStream(db, **params)
+        self.executor = executor
+        self.max_pending = max_pending
+
+    def each(self, callback):
+        """ call `callback` with each change. The result of the future
+        is the number of changes, once the feed is closed. """
+        def each():
+            count = 0
+            for change in self.stream:
+                callback(change)
+                count += 1
+            return count
+        return self.executor.submit(each)
+
+    def __iter__(self):
+        return iter_in_background(self.stream, self.max_pending)
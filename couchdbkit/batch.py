@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -
+#
+# This file is part of couchdbkit released under the MIT license.
+# See the NOTICE for more information.
+#
+# module to buffer document writes and save them with _bulk_docs
+#
+
+from __future__ import with_statement
+
+import logging
+import sys
+import threading
+import time
+
+from .exceptions import BulkSaveError, ResourceConflict
+from .utils import json_dumps
+from .workers import Future
+
+DEFAULT_BATCH_MAX_DOCS = 500
+DEFAULT_BATCH_MAX_DELAY = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter(object):
+    """ buffer documents and save them with `Database.save_docs`. A batch
+    is sent when `max_docs` documents or `max_bytes` bytes are buffered, or
+    `max_delay` seconds after the first document of the batch has been
+    buffered. Batches are sent by a background thread::
+
+        from couchdbkit import Server
+
+        s = Server()
+        db = s['testdb']
+
+        with db.batch_writer(max_docs=100) as writer:
+            future = writer.save({"type": "event"})
+
+        print future.result()
+
+    Each `save` returns a `couchdbkit.workers.Future` whose result is the
+    row returned by CouchDB for the document (its `id` and `rev`). If the
+    document can't be saved, a `ResourceConflict` is raised by
+    `result()` for a conflict or a `BulkSaveError` for any other error.
+    """
+
+    def __init__(self, db, max_docs=DEFAULT_BATCH_MAX_DOCS, max_bytes=None,
+            max_delay=DEFAULT_BATCH_MAX_DELAY, **params):
+        """ Constructor of a BatchWriter. The flushing thread is started
+        immediately.
+
+        @param db: Database instance
+        @param max_docs: int, max number of docs sent in one batch
+        @param max_bytes: int, if set a batch is sent as soon as the
+        buffered docs are at least `max_bytes` long once encoded. Docs are
+        then encoded by `save`, later changes to a buffered doc aren't
+        sent.
+        @param max_delay: float, max number of seconds a doc is buffered
+        @param params: params passed to `Database.save_docs`
+        """
+        self.db = db
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.params = params
+
+        self._cond = threading.Condition()
+        self._buffer = []
+        self._size = 0
+        self._deadline = None
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def save(self, doc, callback=None):
+        """ buffer a document.
+
+        @param doc: dict or `Document` instance. It's updated with its
+        `_id` and `_rev` once saved.
+        @param callback: callable, called with the future once the doc
+        is saved.
+
+        @return: `couchdbkit.workers.Future` instance
+        """
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(callback)
+
+        encoded = None
+        if self.max_bytes is not None:
+            # the doc is encoded once, its JSON is sent with the batch
+            encoded = self._encode(doc)
+
+        with self._cond:
+            if self._closed:
+                raise ValueError("the batch writer is closed")
+
+            if not self._buffer:
+                self._deadline = time.time() + self.max_delay
+            self._buffer.append((doc, future, encoded))
+            if encoded is not None:
+                self._size += len(encoded)
+            # wake up the flushing thread to start the delay or flush
+            if len(self._buffer) == 1 or self._is_full():
+                self._cond.notify()
+        return future
+
+    def flush(self):
+        """ save all the buffered documents now, in the calling thread """
+        while True:
+            with self._cond:
+                batch = self._take()
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self):
+        """ save the buffered documents and stop the flushing thread """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _encode(self, doc):
+        if hasattr(doc, "to_json"):
+            try:
+                doc.validate()
+            except AttributeError:
+                pass
+            json_doc = doc.to_json()
+        else:
+            json_doc = doc
+
+        if '_id' not in json_doc and self.params.get('use_uuids', True):
+            nextid = self.db.server.next_uuid()
+            if nextid:
+                json_doc['_id'] = nextid
+        return json_dumps(json_doc)
+
+    def _is_full(self):
+        if len(self._buffer) >= self.max_docs:
+            return True
+        return self.max_bytes is not None and self._size >= self.max_bytes
+
+    def _take(self):
+        batch = self._buffer[:self.max_docs]
+        self._buffer = self._buffer[self.max_docs:]
+        if self.max_bytes is not None:
+            self._size -= sum(len(encoded) for doc, future, encoded in batch)
+        if self._buffer:
+            self._deadline = time.time() + self.max_delay
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and not self._is_full():
+                    if not self._buffer:
+                        self._cond.wait()
+                        continue
+
+                    timeout = self._deadline - time.time()
+                    if timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+
+                if not self._buffer:
+                    if self._closed:
+                        return
+                    continue
+                batch = self._take()
+            try:
+                self._write(batch)
+            except Exception:
+                # keep flushing the next batches
+                logger.exception("error while writing a batch")
+
+    def _write(self, batch):
+        try:
+            self._save(batch)
+        except Exception, e:
+            exc_info = sys.exc_info()
+            for doc, future, encoded in batch:
+                if not future.done():
+                    future.set_exception(e, exc_info)
+
+    def _save(self, batch):
+        docs = [doc for doc, future, encoded in batch]
+        params = self.params
+        if self.max_bytes is not None:
+            params = dict(params,
+                    encoded=[encoded for doc, future, encoded in batch])
+        try:
+            results = self.db.save_docs(docs, **params)
+        except BulkSaveError, e:
+            results = e.results
+
+        for (doc, future, encoded), result in zip(batch, results):
+            if 'error' not in result:
+                future.set_result(result)
+            elif result['error'] == 'conflict':
+                future.set_exception(ResourceConflict(result.get('reason'),
+                    http_code=409))
+            else:
+                future.set_exception(BulkSaveError([result], [result]))
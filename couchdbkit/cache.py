@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -
+#
+# This file is part of couchdbkit released under the MIT license.
+# See the NOTICE for more information.
+
+"""
+In-process caches used by a `Database` to avoid requests::
+
+    from couchdbkit import Server
+    from couchdbkit.cache import DocumentCache
+
+    s = Server()
+    db = s.get_db("testdb", cache=DocumentCache(max_bytes=10 * 1024 * 1024))
+
+Documents are stored as the JSON body returned by CouchDB, with the ETag
+of the response, and decoded each time they are returned so callers never
+share an object. A stale entry is revalidated with an `If-None-Match`
+request; a 304 response counts as a hit.
+
+View results can be cached the same way with a `ViewCache`::
+
+    db = s.get_db("testdb", view_cache=ViewCache())
+"""
+
+from __future__ import absolute_import, with_statement
+
+import threading
+import time
+
+from .utils import json_dumps
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    OrderedDict = None
+
+__all__ = ['CacheEntry', 'LRUCache', 'DocumentCache', 'ViewCache']
+
+DEFAULT_CACHE_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_MISSING_TTL = 1.0
+
+
+class CacheEntry(object):
+    """ an entry of a cache. `value` is None for a missing resource """
+
+    __slots__ = ('value', 'etag', 'expires', 'size')
+
+    def __init__(self, value, etag, expires, size=None):
+        self.value = value
+        self.etag = etag
+        self.expires = expires
+        if size is None:
+            size = len(value or "")
+        self.size = size
+
+    def is_fresh(self):
+        return self.expires is None or self.expires > time.time()
+
+
+class LRUCache(object):
+    """ thread-safe LRU cache capped by the size of its entries. An entry
+    is used without request for `ttl` seconds, after that it must be
+    revalidated with its etag. """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_MAX_BYTES, ttl=0):
+        """ Constructor for LRUCache
+
+        @param max_bytes: int, max size of the cached entries
+        @param ttl: float, number of seconds an entry is used before
+        being revalidated. 0 means always revalidate.
+        """
+        if OrderedDict is None:
+            raise RuntimeError("%s requires python 2.7" %
+                    self.__class__.__name__)
+
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """ return a dict of the cache counters """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "size": self.size
+        }
+
+    def get(self, key):
+        """ return the entry for `key` or None, and mark it as recently
+        used. A fresh entry counts as a hit. """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._entries[key] = entry
+            if entry.is_fresh():
+                self.hits += 1
+            return entry
+
+    def set(self, key, value, etag=None, size=None):
+        """ cache a value fetched from the server. Count a miss. """
+        self._set(key, CacheEntry(value, etag, self._expires(key), size))
+
+    def revalidated(self, key):
+        """ the entry for `key` hasn't changed on the server (304).
+        Count a revalidation and a hit. """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.expires = self._expires(key)
+            self.revalidations += 1
+            self.hits += 1
+
+    def discard(self, key):
+        """ remove the entry for `key` if any """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _expires(self, key):
+        return time.time() + self.ttl
+
+    def _set(self, key, entry):
+        with self._lock:
+            self.misses += 1
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+
+            if entry.size > self.max_bytes:
+                return
+
+            self._entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+                self.evictions += 1
+
+
+class DocumentCache(LRUCache):
+    """ cache of document bodies used by `Database.open_doc` and
+    `Database.doc_exist`.
+
+    Entries are keyed by `(db_uri, docid, rev)` so a cache can be shared
+    by several databases. An entry for a given revision
+    never expires, an entry for the latest revision (rev is None) is used
+    without request for `ttl` seconds and revalidated after that. Missing
+    documents are cached for `missing_ttl` seconds.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_MAX_BYTES, ttl=0,
+            missing_ttl=DEFAULT_MISSING_TTL):
+        """ Constructor for DocumentCache
+
+        @param max_bytes: int, max size of the cached bodies
+        @param ttl: float, number of seconds an entry is used before
+        being revalidated. 0 means always revalidate.
+        @param missing_ttl: float, number of seconds a missing document
+        is cached. 0 disable it.
+        """
+        super(DocumentCache, self).__init__(max_bytes=max_bytes, ttl=ttl)
+        self.missing_ttl = missing_ttl
+
+    def set_missing(self, key):
+        """ cache a 404 for `key`. Count a miss. """
+        if self.missing_ttl:
+            self._set(key, CacheEntry(None, None,
+                time.time() + self.missing_ttl))
+        else:
+            self.discard(key)
+            with self._lock:
+                self.misses += 1
+
+    def invalidate(self, db_uri, docid, rev=None):
+        """ remove the entry of a document """
+        self.discard((db_uri, docid, rev))
+
+    def _expires(self, key):
+        if key[2] is not None:
+            # a revision never changes
+            return None
+        return time.time() + self.ttl
+
+
+class ViewCache(LRUCache):
+    """ cache of view results used by `View` queries.
+
+    Results are stored decoded with the ETag of the response, which
+    changes with the update sequence of the index. A query is sent again
+    with `If-None-Match`; on a 304 the cached result is returned without
+    transferring or decoding the body. Unless `copy` is False, each query
+    gets its own copy of the result so it can be modified safely.
+
+    Queries are keyed by the full uri of the view, so a cache can be
+    shared by several databases.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_MAX_BYTES, ttl=0, copy=True):
+        """ Constructor for ViewCache
+
+        @param max_bytes: int, max size of the cached results, measured
+        as the size of their JSON bodies.
+        @param ttl: float, number of seconds a result is used before
+        being revalidated. 0 means always revalidate.
+        @param copy: bool, if False the cached results are shared and
+        must not be modified.
+        """
+        super(ViewCache, self).__init__(max_bytes=max_bytes, ttl=ttl)
+        self.copy = copy
+
+    def key(self, view_uri, params, keys=None):
+        """ return the key of a query. `params` are the params encoded by
+        `couchdbkit.resource.encode_params`. """
+        return query_key(view_uri, params, keys)
+
+    def result(self, entry):
+        """ return the result stored in `entry` """
+        if self.copy:
+            return copy_json(entry.value)
+        return entry.value
+
+
+def query_key(path, params, keys=None):
+    """ return a hashable key identifying a query """
+    if keys is not None:
+        keys = json_dumps(keys)
+    return (path, tuple(sorted(params.items())), keys)
+
+
+def copy_json(value):
+    """ copy a decoded JSON value, faster than `copy.deepcopy` """
+    if isinstance(value, dict):
+        return dict((k, copy_json(v)) for k, v in value.iteritems())
+    elif isinstance(value, list):
+        return [copy_json(v) for v in value]
+    return value
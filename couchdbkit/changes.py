@@ -6,7 +6,7 @@
 # module to fetch and stream changes from a database
 #
 
-from .utils import json
+from .utils import json_loads
 
 class ChangesStream(object):
     """ change stream object::
@@ -40,7 +40,7 @@ class ChangesStream(object):
         return False
 
     def __iter__(self):
-        r = self.db.res.get("_changes", **self.params)
+        r = self.db.changes_res.get("_changes", **self.params)
         with r.body_stream() as body:
             while True:
                 line = body.readline()
@@ -65,7 +65,7 @@ class ChangesStream(object):
             return None
         else:
             try:
-                obj = json.loads(line)
+                obj = json_loads(line)
                 return obj
             except ValueError, e:
                 return None
@@ -26,28 +26,47 @@ Example:
     >>> del server['simplecouchdb_test']
 
 """
-from __future__ import absolute_import
+from __future__ import absolute_import, with_statement
 
 from collections import deque
 from itertools import groupby
 from mimetypes import guess_type
+import re
+import sys
+import threading
 import time
+import urlparse
 
 from restkit import BasicAuth
 from restkit.util import url_quote
 
 from . import resource
+from .batch import BatchWriter, DEFAULT_BATCH_MAX_DOCS, \
+DEFAULT_BATCH_MAX_DELAY
+from .cache import copy_json, query_key
+from .cluster import Cluster, ClusterResource
+from .pool import CouchdbPool, DEFAULT_IDLE_TIMEOUT, DEFAULT_POOL_SIZE, \
+get_default_pool
 from .exceptions import (
     InvalidAttachment, NoResultFound, ResourceNotFound, ResourceConflict,
     BulkSaveError, MultipleResultsFound
 )
-from .utils import validate_dbname
+from .utils import json, json_dumps, json_loads, validate_dbname
+from .uuids import get_uuid_generator
+from .workers import DEFAULT_CONCURRENCY, parallel_map
 
 DEFAULT_UUID_BATCH_COUNT = 1000
+DEFAULT_STREAM_CHUNK_SIZE = 16384
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_CHUNK_SIZE = 500
 UNKOWN_INFO = {}
 
+# request bodies with at least this number of docs or keys are encoded
+# while they are sent instead of at once
+STREAM_PAYLOAD_MIN_ITEMS = 1000
 
-def _maybe_serialize(doc):
+
+def _maybe_serialize(doc, copy=True):
     if hasattr(doc, "to_json"):
         # try to validate doc first
         try:
@@ -57,11 +76,50 @@ def _maybe_serialize(doc):
 
         return doc.to_json(), True
     elif isinstance(doc, dict):
+        if not copy:
+            return doc, False
         return doc.copy(), False
 
     return doc, False
 
 
+def _json_payload(obj, items):
+    """ return a `JSONPayload` streaming `obj` if `items`, the list it
+    contains, is large """
+    if len(items) >= STREAM_PAYLOAD_MIN_ITEMS:
+        return resource.JSONPayload(obj)
+    return obj
+
+
+def _split_docs(docs, chunk_size=None, max_bytes=None):
+    """ split docs in chunks of at most `chunk_size` docs and, when docs
+    are already encoded, of at most `max_bytes` bytes. """
+    if chunk_size is None and max_bytes is None:
+        return [docs]
+
+    chunks = []
+    chunk = []
+    size = 0
+    for doc in docs:
+        if chunk:
+            if chunk_size is not None and len(chunk) >= chunk_size:
+                full = True
+            else:
+                full = max_bytes is not None and \
+                        size + len(doc) + 1 > max_bytes
+            if full:
+                chunks.append(chunk)
+                chunk = []
+                size = 0
+
+        chunk.append(doc)
+        if max_bytes is not None:
+            size += len(doc) + 1
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
 class Server(object):
     """
     Server object that allows you to access and manage a couchdb node. A
@@ -73,17 +131,54 @@ class Server(object):
     def __init__(self, uri={'URL': 'http://127.0.0.1:5984'},
             uuid_batch_count=DEFAULT_UUID_BATCH_COUNT,
             resource_class=None, resource_instance=None,
+            uuid_generator=None, uuid_prefetch=None, max_connections=None,
+            idle_timeout=None, warm_connections=0, changes_pool=None,
             **client_opts):
         """
         Constructor for Server object
 
-        @param uri: uri of CouchDb host
+        @param uri: uri of CouchDb host. A list of uris or a
+            `couchdbkit.cluster.Cluster` instance to route requests between
+            the nodes of a cluster.
         @param uuid_batch_count: max of uuids to get in one time
         @param resource_instance: `restkit.resource.CouchdbDBResource` instance.
             It alows you to set a resource class with custom parameters.
+        @param uuid_generator: "random", "sequential" or a callable
+            returning a new uuid. If set uuids are generated locally
+            instead of being fetched from CouchDB. See `couchdbkit.uuids`.
+        @param uuid_prefetch: int, when fewer uuids than this number are
+            left, new uuids are fetched in a background thread.
+        @param max_connections: int, max number of connections in use
+            per host. Requests wait for a connection above this limit.
+        @param idle_timeout: float, number of seconds an idle connection
+            is kept in the pool.
+        @param warm_connections: int, number of connections opened when
+            the server object is created.
+        @param changes_pool: `couchdbkit.pool.CouchdbPool` instance used
+            by requests to `_changes`. By default a pool shared by all
+            the servers, distinct from the one used by other requests.
+        @param transport: a `couchdbkit.transport` transport instance or
+            name ("restkit", "http", "urllib3") sending the requests. The
+            restkit client and its pools are used by default.
+        @param gzip: `couchdbkit.compression.GzipPolicy` instance to
+            accept compressed responses and compress large requests.
+
+        Unless a `pool` is given, a pool dedicated to this server is
+        created when `pool_size`, `max_connections` or `idle_timeout` is
+        set. Otherwise the default pool is shared with other servers.
         """
         filters = []
 
+        self.cluster = None
+        if isinstance(uri, (list, tuple)):
+            uri = Cluster(uri)
+        if isinstance(uri, Cluster):
+            self.cluster = uri
+            uri = self.cluster.uri
+            client_opts['cluster'] = self.cluster
+            if resource_class is None:
+                resource_class = ClusterResource
+
         if isinstance(uri, dict):
             uri_settings = uri  # Change the refrence to the dict
 
@@ -103,20 +198,78 @@ class Server(object):
         self.uri = uri
         self.uuid_batch_count = uuid_batch_count
         self._uuid_batch_count = uuid_batch_count
+        self.uuid_generator = get_uuid_generator(uuid_generator)
+        self.uuid_prefetch = uuid_prefetch
+        self._uuids_lock = threading.Lock()
+        self._uuids_prefetching = False
 
         if resource_class is not None:
             self.resource_class = resource_class
 
+        backend = client_opts.get('backend', 'thread')
+        if client_opts.get('pool') is None:
+            if 'pool_size' in client_opts or max_connections is not None \
+                    or idle_timeout is not None:
+                client_opts['pool'] = CouchdbPool(
+                        max_size=client_opts.get('pool_size',
+                            DEFAULT_POOL_SIZE),
+                        max_connections=max_connections,
+                        idle_timeout=idle_timeout or DEFAULT_IDLE_TIMEOUT,
+                        backend=backend)
+            else:
+                client_opts['pool'] = get_default_pool(backend)
+        self.pool = client_opts['pool']
+        if changes_pool is None:
+            changes_pool = get_default_pool(backend, name="changes")
+        self.changes_pool = changes_pool
+
         if resource_instance and isinstance(resource_instance,
                                 resource.CouchdbResource):
             resource_instance.initial['uri'] = uri
             self.res = resource_instance.clone()
             if client_opts:
                 self.res.client_opts.update(client_opts)
+            # same options, with the pool of the feeds and no hedging
+            self.changes_res = self.res.clone(hedge=None,
+                    pool=changes_pool)
         else:
             self.res = self.resource_class(uri, filters=filters, **client_opts)
+            # feeds are long requests, never hedge them
+            client_opts.pop('hedge', None)
+            client_opts['pool'] = changes_pool
+            self.changes_res = self.resource_class(uri, filters=filters,
+                    **client_opts)
         self._uuids = deque()
 
+        if warm_connections:
+            self.warm_connections(warm_connections)
+
+    def warm_connections(self, count):
+        """ open connections to the server, or to each node of the
+        cluster, until `count` connections are idle in the pool """
+        if self.cluster is not None:
+            uris = [node.uri for node in self.cluster.nodes]
+        else:
+            uris = [self.uri]
+
+        for uri in uris:
+            u = urlparse.urlparse(uri)
+            is_ssl = u.scheme == "https"
+            port = u.port or (is_ssl and 443 or 80)
+            self.pool.warm(u.hostname, port, count, is_ssl=is_ssl)
+
+    def pool_stats(self):
+        """ return the stats of the connection pools: `requests` for the
+        pool used by requests and `changes` for the one used by the
+        `_changes` feeds. See `couchdbkit.pool.CouchdbPool.stats`.
+        """
+        stats = {}
+        for name, pool in (("requests", self.pool),
+                ("changes", self.changes_pool)):
+            if hasattr(pool, 'stats'):
+                stats[name] = pool.stats()
+        return stats
+
     def info(self):
         """ info of server
 
@@ -204,16 +357,46 @@ class Server(object):
         """
         return an available uuid from couchdbkit
         """
+        if self.uuid_generator is not None:
+            return self.uuid_generator()
+
         if count is not None:
             self._uuid_batch_count = count
         else:
             self._uuid_batch_count = self.uuid_batch_count
 
         try:
-            return self._uuids.pop()
+            uuid = self._uuids.pop()
         except IndexError:
             self._uuids.extend(self.uuids(count=self._uuid_batch_count)["uuids"])
-            return self._uuids.pop()
+            uuid = self._uuids.pop()
+
+        if self.uuid_prefetch and len(self._uuids) < self.uuid_prefetch:
+            self._prefetch_uuids()
+        return uuid
+
+    def _prefetch_uuids(self):
+        """ refill uuids in a background thread """
+        with self._uuids_lock:
+            if self._uuids_prefetching:
+                return
+            self._uuids_prefetching = True
+
+        def refill():
+            try:
+                # not the count of the last next_uuid call, which may be
+                # the size of a large bulk save
+                self._uuids.extend(
+                        self.uuids(count=self.uuid_batch_count)["uuids"])
+            except Exception:
+                # next_uuid will fetch them if the deque is empty
+                pass
+            with self._uuids_lock:
+                self._uuids_prefetching = False
+
+        t = threading.Thread(target=refill)
+        t.daemon = True
+        t.start()
 
     def __getitem__(self, dbname):
         return Database(self._db_uri(dbname), server=self)
@@ -253,16 +436,27 @@ class Database(object):
     A Database object can act as a Dict object.
     """
 
-    def __init__(self, uri, create=False, server=None, **params):
+    def __init__(self, uri, create=False, server=None, cache=None,
+            view_cache=None, single_flight=None, **params):
         """Constructor for Database
 
         @param uri: str, Database uri
         @param create: boolean, False by default,
         if True try to create the database.
         @param server: Server instance
+        @param cache: `couchdbkit.cache.DocumentCache` instance used by
+        `open_doc` and `doc_exist`. It can be shared by several databases.
+        @param view_cache: `couchdbkit.cache.ViewCache` instance used by
+        the views of this database. It can be shared by several databases.
+        @param single_flight: `couchdbkit.workers.SingleFlight` instance.
+        If set, identical `open_doc` calls and view queries running
+        concurrently share one request.
 
         """
         self.uri = uri
+        self.cache = cache
+        self.view_cache = view_cache
+        self.single_flight = single_flight
         self.server_uri, self.dbname = uri.rsplit("/", 1)
 
         if server is not None:
@@ -281,6 +475,7 @@ class Database(object):
                 self.server.res.put('/%s/' % self.dbname, **params).json_body
 
         self.res = server.res(self.dbname)
+        self.changes_res = server.changes_res(self.dbname)
 
     def __repr__(self):
         return "<%s %s>" % (self.__class__.__name__, self.dbname)
@@ -339,9 +534,16 @@ class Database(object):
         @return: boolean, True if document exist
         """
 
+        if self.cache is not None:
+            entry = self.cache.get((self.uri, docid, None))
+            if entry is not None and entry.is_fresh():
+                return entry.value is not None
+
         try:
             self.res.head(resource.escape_docid(docid))
         except ResourceNotFound:
+            if self.cache is not None:
+                self.cache.set_missing((self.uri, docid, None))
             return False
         return True
 
@@ -352,6 +554,10 @@ class Database(object):
         @param docid: str, document id to retrieve
         @param wrapper: callable. function that takes dict as a param.
         Used to wrap an object.
+        @param raw: if True the JSON of the document is returned as a
+        bytestring without being decoded. If "stream", a file object
+        reading the response is returned, close it to release the
+        connection.
         @param **params: See doc api for parameters to use:
         http://wiki.apache.org/couchdb/HTTP_Document_API
 
@@ -367,8 +573,21 @@ class Database(object):
                 raise TypeError("invalid schema")
             wrapper = schema.wrap
 
-        docid = resource.escape_docid(docid)
-        doc = self.res.get(docid, **params).json_body
+        raw = params.pop("raw", False)
+        if raw and wrapper is not None:
+            raise TypeError("a raw document can't be wrapped")
+        if raw == "stream":
+            return self.res.get(resource.escape_docid(docid),
+                    **params).body_stream()
+
+        if self.single_flight is not None:
+            key = (query_key("%s/%s" % (self.uri, docid),
+                resource.encode_params(params)), raw)
+            doc = self.single_flight.do(key, self._fetch_doc, docid, params,
+                    raw)
+        else:
+            doc = self._fetch_doc(docid, params, raw)
+
         if wrapper is not None:
             if not callable(wrapper):
                 raise TypeError("wrapper isn't a callable")
@@ -378,6 +597,97 @@ class Database(object):
         return doc
     get = open_doc
 
+    def _fetch_doc(self, docid, params, raw=False):
+        if self.cache is not None and set(params) <= set(['rev']):
+            body = self._open_cached_doc(docid, params.get('rev'))
+        else:
+            resp = self.res.get(resource.escape_docid(docid), **params)
+            if not raw:
+                return resp.json_body
+            body = resp.body_string()
+
+        if raw:
+            return body
+        return json_loads(body)
+
+    def _open_cached_doc(self, docid, rev=None):
+        """ get the JSON of a document through the cache. A stale entry
+        is revalidated with its etag. """
+        key = (self.uri, docid, rev)
+        entry = self.cache.get(key)
+        if entry is not None and entry.is_fresh():
+            if entry.value is None:
+                raise ResourceNotFound("missing", http_code=404)
+            return entry.value
+
+        headers = {}
+        if entry is not None and entry.etag:
+            headers['If-None-Match'] = entry.etag
+
+        try:
+            resp = self.res.get(resource.escape_docid(docid),
+                    headers=headers, rev=rev)
+        except ResourceNotFound:
+            self.cache.set_missing(key)
+            raise
+
+        body = resp.body_string()
+        if resp.status_int == 304:
+            self.cache.revalidated(key)
+            return entry.value
+
+        self.cache.set(key, body, resp['etag'])
+        return body
+
+    def _invalidate(self, docid):
+        if self.cache is not None:
+            self.cache.invalidate(self.uri, docid)
+
+    def open_docs(self, ids, schema=None, wrapper=None,
+            chunk_size=DEFAULT_CHUNK_SIZE, concurrency=DEFAULT_CONCURRENCY,
+            **params):
+        """ Get multiple documents from the database.
+
+        Ids are split in chunks fetched with `_all_docs?include_docs=true`
+        and the chunks are fetched in parallel.
+
+        @param ids: list of document ids
+        @param schema: Object with a wrap method used to wrap documents
+        @param wrapper: callable. function that takes dict as a param.
+        Used to wrap an object.
+        @param chunk_size: int, max number of ids requested at once
+        @param concurrency: int, max number of parallel requests
+        @param **params: params passed to `_all_docs`
+
+        @return: list of documents in the same order as `ids`. Missing or
+        deleted documents are None.
+        """
+        if schema is not None:
+            if not hasattr(schema, "wrap"):
+                raise TypeError("invalid schema")
+            wrapper = schema.wrap
+
+        if wrapper is not None and not callable(wrapper):
+            raise TypeError("wrapper isn't a callable")
+
+        ids = list(ids)
+        chunks = [ids[i:i + chunk_size] for i in range(0, len(ids),
+            chunk_size)]
+
+        def fetch(keys):
+            return self.res.post('_all_docs',
+                    payload=_json_payload({'keys': keys}, keys),
+                    include_docs=True, **params).json_body['rows']
+
+        docs = []
+        for rows in parallel_map(fetch, chunks, concurrency=concurrency):
+            for row in rows:
+                doc = row.get('doc')
+                if doc is not None and wrapper is not None:
+                    doc = wrapper(doc)
+                docs.append(doc)
+        return docs
+
     def list(self, list_name, view_name, **params):
         """ Execute a list function on the server and return the response.
         If the response is json it will be deserialized, otherwise the string
@@ -386,6 +696,8 @@ class Database(object):
         Args:
             @param list_name: should be 'designname/listname'
             @param view_name: name of the view to run through the list document
+            @param raw: if True the response is returned as a bytestring.
+            If "stream", a file object reading the response is returned.
             @param params: params of the list
         """
         list_name = list_name.split('/')
@@ -393,7 +705,8 @@ class Database(object):
         vname = '/'.join(list_name)
         list_path = '_design/%s/_list/%s/%s' % (dname, vname, view_name)
 
-        return self.res.get(list_path, **params).json_body
+        raw = params.pop('raw', False)
+        return _response_body(self.res.get(list_path, **params), raw)
 
     def show(self, show_name, doc_id, **params):
         """ Execute a show function on the server and return the response.
@@ -403,6 +716,8 @@ class Database(object):
         Args:
             @param show_name: should be 'designname/showname'
             @param doc_id: id of the document to pass into the show document
+            @param raw: if True the response is returned as a bytestring.
+            If "stream", a file object reading the response is returned.
             @param params: params of the show
         """
         show_name = show_name.split('/')
@@ -410,7 +725,8 @@ class Database(object):
         vname = '/'.join(show_name)
         show_path = '_design/%s/_show/%s/%s' % (dname, vname, doc_id)
 
-        return self.res.get(show_path, **params).json_body
+        raw = params.pop('raw', False)
+        return _response_body(self.res.get(show_path, **params), raw)
 
     def all_docs(self, by_seq=False, **params):
         """Get all documents from a database
@@ -426,6 +742,7 @@ class Database(object):
         Args:
         @param by_seq: bool, if True the "_all_docs_by_seq" is passed to
         couchdb. It will return an updated list of all documents.
+        @param raw: return the response without decoding it. See `view`.
 
         @return: list, results of the view
         """
@@ -448,7 +765,7 @@ class Database(object):
         return response['etag'].strip('"')
 
     def save_doc(self, doc, encode_attachments=True, force_update=False,
-            **params):
+            copy=True, **params):
         """ Save a document. It will use the `_id` member of the document
         or request a new uuid from CouchDB. IDs are attached to
         documents on the client side because POST has the curious property of
@@ -460,6 +777,8 @@ class Database(object):
         by CouchDB server when you save.
         @param force_update: boolean, if there is conlict, try to update
         with latest revision
+        @param copy: boolean, if False a dict is encoded as is instead of
+        being copied, and only its `_id` and `_rev` are updated.
         @param params, list of optionnal params, like batch="ok"
 
         @return res: result of save. doc is updated in the mean time
@@ -467,9 +786,10 @@ class Database(object):
         if doc is None:
             doc1 = {}
         else:
-            doc1, schema = _maybe_serialize(doc)
+            doc1, schema = _maybe_serialize(doc, copy=copy)
 
-        if '_attachments' in doc1 and encode_attachments:
+        if encode_attachments and \
+                resource.has_inline_attachments(doc1.get('_attachments')):
             doc1['_attachments'] = resource.encode_attachments(doc['_attachments'])
 
         if '_id' in doc:
@@ -493,19 +813,20 @@ class Database(object):
             except:
                 res = self.res.post(payload=doc1, **params).json_body
 
-        if 'batch' in params and 'id' in res:
-            doc1.update({'_id': res['id']})
-        else:
-            doc1.update({'_id': res['id'], '_rev': res['rev']})
+        self._invalidate(res['id'])
+        doc1['_id'] = res['id']
+        if 'batch' not in params or 'id' not in res:
+            doc1['_rev'] = res['rev']
 
         if schema:
             doc._doc = doc1
-        else:
+        elif doc1 is not doc:
             doc.update(doc1)
         return res
 
     def save_docs(self, docs, use_uuids=True, all_or_nothing=False,
-            **params):
+            chunk_size=None, max_bytes=None, concurrency=DEFAULT_CONCURRENCY,
+            copy=True, encoded=None, **params):
         """ bulk save. Modify Multiple Documents With a Single Request
 
         @param docs: list of docs
@@ -513,22 +834,41 @@ class Database(object):
         @param all_or_nothing: In the case of a power failure, when the database
         restarts either all the changes will have been saved or none of them.
         However, it does not do conflict checking, so the documents will
+        @param chunk_size: int, if set docs are sent in requests of at most
+        `chunk_size` docs.
+        @param max_bytes: int, if set docs are sent in requests whose body
+        is at most `max_bytes` long (a bigger doc is sent alone).
+        @param concurrency: int, max number of requests sent in parallel
+        when docs are split.
+        @param copy: boolean, if False dicts are encoded as is instead of
+        being copied first.
+        @param encoded: list, JSON strings of `docs`, in the same order,
+        sent instead of encoding the docs again. Docs must already have
+        an `_id` if uuids are needed.
+
+        Results of all the requests are merged in one list, in the order of
+        `docs`. If a request fails, the docs saved by the other requests
+        are updated before its exception is raised.
 
         .. seealso:: `HTTP Bulk Document API <http://wiki.apache.org/couchdb/HTTP_Bulk_Document_API>`
 
         """
 
-        docs1 = []
-        docs_schema = []
-        for doc in docs:
-            doc1, schema = _maybe_serialize(doc)
-            docs1.append(doc1)
-            docs_schema.append(schema)
+        if encoded is not None:
+            docs1 = encoded
+            docs_schema = [hasattr(doc, "to_json") for doc in docs]
+        else:
+            docs1 = []
+            docs_schema = []
+            for doc in docs:
+                doc1, schema = _maybe_serialize(doc, copy=copy)
+                docs1.append(doc1)
+                docs_schema.append(schema)
 
         def is_id(doc):
             return '_id' in doc
 
-        if use_uuids:
+        if use_uuids and encoded is None:
             noids = []
             for k, g in groupby(docs1, is_id):
                 if not k:
@@ -540,34 +880,92 @@ class Database(object):
                 if nextid:
                     doc['_id'] = nextid
 
-        payload = {"docs": docs1}
-        if all_or_nothing:
-            payload["all_or_nothing"] = True
+        if max_bytes is not None and encoded is None:
+            # encode docs once, chunks are sent as strings
+            docs1 = [json_dumps(doc) for doc in docs1]
+        chunks = _split_docs(docs1, chunk_size, max_bytes)
+        if all_or_nothing and len(chunks) > 1:
+            raise ValueError("all_or_nothing can't be used when docs are "
+                    "sent in multiple requests")
+
+        def bulk_save(chunk):
+            if max_bytes is not None or encoded is not None:
+                payload = '{"docs":[%s]%s}' % (",".join(chunk),
+                        all_or_nothing and ',"all_or_nothing":true' or '')
+                return self.res.post('/_bulk_docs', payload=payload,
+                        headers={"Content-Type": "application/json"},
+                        **params).json_body
+
+            payload = {"docs": chunk}
+            if all_or_nothing:
+                payload["all_or_nothing"] = True
+            return self.res.post('/_bulk_docs',
+                    payload=_json_payload(payload, chunk), **params).json_body
+
+        # a failed request stops the chunks not sent yet, the docs of the
+        # chunks already saved are still updated before raising
+        failures = []
+        def try_bulk_save(chunk):
+            if failures:
+                return None
+            try:
+                return bulk_save(chunk)
+            except Exception:
+                failures.append(sys.exc_info())
+                return None
 
         # update docs
-        results = self.res.post('/_bulk_docs',
-                payload=payload, **params).json_body
+        results = []
+        offsets = []
+        offset = 0
+        for chunk, chunk_results in zip(chunks, parallel_map(try_bulk_save,
+                chunks, concurrency=concurrency)):
+            if chunk_results is not None:
+                results.extend(chunk_results)
+                offsets.extend(range(offset, offset + len(chunk_results)))
+            offset += len(chunk)
 
         errors = []
-        for i, res in enumerate(results):
+        for i, res in zip(offsets, results):
+            if 'id' in res:
+                self._invalidate(res['id'])
+
             if 'error' in res:
                 errors.append(res)
             else:
                 if docs_schema[i]:
-                    docs[i]._doc.update({
-                        '_id': res['id'],
-                        '_rev': res['rev']
-                    })
+                    doc = docs[i]._doc
                 else:
-                    docs[i].update({
-                        '_id': res['id'],
-                        '_rev': res['rev']
-                    })
+                    doc = docs[i]
+                doc['_id'] = res['id']
+                doc['_rev'] = res['rev']
+        if failures:
+            exc_type, exc_value, tb = failures[0]
+            raise exc_type, exc_value, tb
         if errors:
             raise BulkSaveError(errors, results)
         return results
     bulk_save = save_docs
 
+    def batch_writer(self, max_docs=DEFAULT_BATCH_MAX_DOCS, max_bytes=None,
+            max_delay=DEFAULT_BATCH_MAX_DELAY, **params):
+        """ return a `couchdbkit.batch.BatchWriter` buffering docs and
+        saving them in batches with `save_docs`. It can be used as a
+        context manager, buffered docs are saved when leaving it::
+
+            with db.batch_writer(max_docs=500, max_delay=0.5) as writer:
+                for event in events:
+                    writer.save(event)
+
+        @param max_docs: int, max number of docs sent in one request
+        @param max_bytes: int, send a batch as soon as the buffered docs
+        are at least `max_bytes` long once encoded.
+        @param max_delay: float, max number of seconds a doc is buffered
+        @param params: params passed to `save_docs`
+        """
+        return BatchWriter(self, max_docs=max_docs, max_bytes=max_bytes,
+                max_delay=max_delay, **params)
+
     def delete_docs(self, docs, all_or_nothing=False,
             empty_on_delete=False, **params):
         """ bulk delete.
@@ -579,6 +977,8 @@ class Database(object):
         @param all_or_nothing: In the case of a power failure, when the database
         restarts either all the changes will have been saved or none of them.
         However, it does not do conflict checking, so the documents will
+        @param params: other params are passed to `save_docs`, ex:
+        chunk_size, max_bytes, concurrency.
 
         .. seealso:: `HTTP Bulk Document API <http://wiki.apache.org/couchdb/HTTP_Bulk_Document_API>`
 
@@ -619,10 +1019,12 @@ class Database(object):
 
             docid = resource.escape_docid(doc1['_id'])
             result = self.res.delete(docid, rev=doc1['_rev'], **params).json_body
+            self._invalidate(doc1['_id'])
         elif isinstance(doc1, basestring):  # we get a docid
             rev = self.get_rev(doc1)
             docid = resource.escape_docid(doc1)
             result = self.res.delete(docid, rev=rev, **params).json_body
+            self._invalidate(doc1)
 
         if schema:
             doc._doc.update({
@@ -670,6 +1072,7 @@ class Database(object):
         if destination:
             headers.update({"Destination": str(destination)})
             result = self.res.copy('/%s' % docid, headers=headers).json_body
+            self._invalidate(result.get('id'))
             return result
 
         return {'ok': False}
@@ -688,6 +1091,14 @@ class Database(object):
         and beginning slash will be removed. Usefull with c-l for example.
         @param schema, Object with a wrapper function
         @param wrapper: function used to wrap results
+        @param stream: boolean, if True rows are parsed and wrapped while
+        the response is read instead of being loaded at once.
+        See `ViewResults.iterstream`.
+        @param raw: if True the response is returned as a bytestring,
+        without being decoded. If "stream", a file object reading the
+        response is returned. If "rows", an iterator of the rows, each
+        one as the bytestring of its JSON. See `ViewResults.raw_body`,
+        `ViewResults.raw_stream` and `ViewResults.iter_raw_rows`.
         @param params: params of the view
 
         """
@@ -751,7 +1162,27 @@ class Database(object):
                 wrapper = get_multi_wrapper(schema, wrap_doc=wrap_doc,
                     dynamic_properties=dynamic_properties)
 
-        return View(self, view_path, wrapper=wrapper)(**params)
+        raw = params.pop('raw', False)
+        results = View(self, view_path, wrapper=wrapper)(**params)
+        if not raw:
+            return results
+        elif raw == "stream":
+            return results.raw_stream()
+        elif raw == "rows":
+            return results.iter_raw_rows()
+        return results.raw_body()
+
+    def iterview(self, view_name, batch=DEFAULT_PAGE_SIZE, schema=None,
+            wrapper=None, **params):
+        """ iterate over all the rows of a view, fetching them by pages of
+        `batch` rows. Pages are requested with the key and docid of the
+        last row received instead of `skip`, so walking the whole view
+        costs the same for each page. Takes the same arguments as `view`.
+
+        @param batch: int, number of rows fetched in one request.
+        """
+        return self.view(view_name, schema=schema, wrapper=wrapper,
+                **params).paginate(batch)
 
     def temp_view(self, design, schema=None, wrapper=None, **params):
         """ get adhoc view results. Like view it reeturn a ViewResult object."""
@@ -834,6 +1265,7 @@ class Database(object):
         docid = resource.escape_docid(doc1['_id'])
         res = self.res(docid).put(name, payload=content,
                 headers=headers, rev=doc1['_rev']).json_body
+        self._invalidate(doc1['_id'])
 
         if res['ok']:
             new_doc = self.get(doc1['_id'], rev=res['rev'])
@@ -855,6 +1287,7 @@ class Database(object):
 
         res = self.res(docid).delete(name, rev=doc1['_rev'],
                 headers=headers).json_body
+        self._invalidate(doc1['_id'])
         if res['ok']:
             new_doc = self.get(doc1['_id'], rev=res['rev'])
             doc.update(new_doc)
@@ -915,6 +1348,159 @@ class Database(object):
         return (len(self) > 0)
 
 
+re_rows_sep = re.compile(r'[\s,]*')
+
+def _iter_view_rows(body, on_meta=None,
+        chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+    """ incrementally parse a view response read from `body`, a file-like
+    object, and yield rows one by one as soon as they are decoded. Only
+    the current row and the last chunk read are kept in memory.
+
+    @param on_meta: callable, called with a dict of the members found
+    around the rows array (total_rows, offset, ...).
+    @param chunk_size: int, size of the blocks read from the body.
+    """
+    decoder = json.JSONDecoder()
+
+    # read the envelope until the beginning of the rows array
+    buf = ""
+    while True:
+        idx = buf.find('"rows":')
+        if idx >= 0:
+            start = buf.find('[', idx)
+            if start >= 0:
+                break
+        data = body.read(chunk_size)
+        if not data:
+            # no rows in this response, decode what we got
+            if buf.strip() and on_meta is not None:
+                on_meta(json_loads(buf))
+            return
+        buf += data
+
+    if on_meta is not None:
+        on_meta(json_loads(buf[:idx].rstrip().rstrip(',') + '}'))
+
+    pos = start + 1
+    eof = False
+    while True:
+        pos = re_rows_sep.match(buf, pos).end()
+        if pos < len(buf):
+            if buf[pos] == ']':
+                break
+
+            try:
+                row, pos = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+            else:
+                yield row
+                continue
+        elif eof:
+            raise ValueError("unexpected end of the view response")
+
+        # need more data. Read at least as much as we already have so
+        # large rows are decoded in a linear time.
+        buf = buf[pos:]
+        pos = 0
+        data = body.read(max(chunk_size, len(buf)))
+        if not data:
+            eof = True
+        buf += data
+
+    # members following the rows array
+    tail = (buf[pos + 1:] + body.read()).strip()
+    if tail.startswith(',') and on_meta is not None:
+        on_meta(json_loads('{' + tail[1:]))
+
+
+re_raw_token = re.compile(r'["{}\[\]]')
+re_raw_string_end = re.compile(r'["\\]')
+
+def _iter_raw_view_rows(body, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+    """ split a view response read from `body` in rows without decoding
+    them, and yield the JSON of each row as a bytestring.
+
+    @param chunk_size: int, size of the blocks read from the body.
+    """
+    buf = ""
+    while True:
+        idx = buf.find('"rows":')
+        if idx >= 0:
+            start = buf.find('[', idx)
+            if start >= 0:
+                break
+        data = body.read(chunk_size)
+        if not data:
+            return
+        buf += data
+
+    pos = start + 1
+    row_start = None
+    depth = 0
+    in_string = False
+    while True:
+        if in_string:
+            m = re_raw_string_end.search(buf, pos)
+            if m is not None:
+                if m.group() == '"':
+                    in_string = False
+                    pos = m.end()
+                    continue
+                elif m.end() < len(buf):
+                    # skip the escaped character
+                    pos = m.end() + 1
+                    continue
+                pos = m.start()
+            else:
+                pos = len(buf)
+        else:
+            if depth == 0:
+                pos = re_rows_sep.match(buf, pos).end()
+                if pos < len(buf):
+                    if buf[pos] == ']':
+                        return
+                    row_start = pos
+
+            m = re_raw_token.search(buf, pos)
+            if m is not None:
+                pos = m.end()
+                token = m.group()
+                if token == '"':
+                    in_string = True
+                elif token in '{[':
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        yield buf[row_start:pos]
+                        row_start = None
+                continue
+            pos = len(buf)
+
+        # need more data, keep the current row
+        keep = pos if row_start is None else row_start
+        buf = buf[keep:]
+        pos -= keep
+        if row_start is not None:
+            row_start = 0
+        data = body.read(max(chunk_size, len(buf)))
+        if not data:
+            raise ValueError("unexpected end of the view response")
+        buf += data
+
+
+def _response_body(resp, raw=False):
+    """ return the decoded body of a response, its bytes if `raw` is True
+    or a file object reading it if `raw` is "stream" """
+    if raw == "stream":
+        return resp.body_stream()
+    elif raw:
+        return resp.body_string()
+    return resp.json_body
+
+
 class ViewResults(object):
     """
     Object to retrieve view results.
@@ -929,13 +1515,21 @@ class ViewResults(object):
 
         """
         self.view = view
+        self.stream = params.pop('stream', False)
         self.params = params
         self._result_cache = None
         self._total_rows = None
         self._offset = 0
+        self._meta_fetched = False
+        self._limited_rows = {}
         self._dynamic_keys = []
 
     def iterator(self):
+        if self.stream and not self._result_cache:
+            return self.iterstream()
+        return self._iterator()
+
+    def _iterator(self):
         self._fetch_if_needed()
         rows = self._result_cache.get('rows', [])
         wrapper = self.view._wrapper
@@ -945,17 +1539,132 @@ class ViewResults(object):
             else:
                 yield row
 
+    def _wrap_row(self, row):
+        if self.view._wrapper is not None:
+            return self.view._wrapper(row)
+        return row
+
+    def _fetch_rows(self, limit, **params):
+        """ return at most `limit` rows. Use the cached results if any,
+        else execute the query with this limit without caching it. """
+        if self._result_cache:
+            return self._result_cache.get('rows', [])[:limit]
+
+        if self.params.get('limit') is not None:
+            limit = min(limit, self.params['limit'])
+        key = (limit, tuple(sorted(params.items())))
+        rows = self._limited_rows.get(key)
+        if rows is None:
+            result = self._query(limit=limit, **params)
+            self._set_meta(result)
+            rows = self._limited_rows[key] = result.get('rows', [])
+        return rows
+
+    def _query(self, **params):
+        """ execute the query with `params` overriding the current ones """
+        query = self.params.copy()
+        query.update(params)
+        return self.view._exec_json(**query)
+
+    def _fetch_meta_if_needed(self):
+        if not self._result_cache and not self._meta_fetched:
+            self._set_meta(self._query(limit=0))
+
+    def _is_reduced(self):
+        """ True if the query params show the view is reduced """
+        params = self.params
+        if params.get('reduce') is False:
+            return False
+        return params.get('reduce') is True or 'group' in params or \
+                'group_level' in params
+
+    def iterstream(self, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+        """ iterate over the rows while they are read from the response.
+
+        Rows are parsed incrementally and wrapped one by one, so the memory
+        used doesn't depend on the size of the result. Results aren't
+        cached, each call execute the query again.
+
+        @param chunk_size: int, size of the blocks read from the response.
+        """
+        resp = self.view._exec(**self.params)
+        wrapper = self.view._wrapper
+        body = resp.body_stream()
+        done = False
+        try:
+            for row in _iter_view_rows(body, on_meta=self._set_meta,
+                    chunk_size=chunk_size):
+                if wrapper is not None:
+                    yield wrapper(row)
+                else:
+                    yield row
+            done = True
+        finally:
+            if done:
+                body.close()
+            else:
+                # don't read the remaining rows, drop the connection
+                resp.close()
+
+    def paginate(self, page_size=DEFAULT_PAGE_SIZE):
+        """ iterate over the rows of the view by fetching pages of
+        `page_size` rows. Each page starts at the key (and docid) of the last
+        row of the previous one with skip=1, so the server never has to skip
+        over the rows already read. Rows are wrapped lazily.
+
+        @param page_size: int, number of rows to fetch by request.
+        """
+        if page_size < 1:
+            raise ValueError("page_size should be a positive integer")
+
+        params = self.params.copy()
+        if 'keys' in params:
+            raise ValueError("keys can't be used to paginate a view")
+        elif 'key' in params:
+            params['startkey'] = params['endkey'] = params.pop('key')
+
+        remaining = params.pop('limit', None)
+        wrapper = self.view._wrapper
+        while True:
+            limit = page_size
+            if remaining is not None:
+                if remaining <= 0:
+                    return
+                limit = min(limit, remaining)
+
+            rows = self.view._exec(limit=limit, **params).json_body.get(
+                    'rows', [])
+            if rows:
+                last = rows[-1]
+                startkey, startkey_docid = last['key'], last.get('id')
+
+            for row in rows:
+                if wrapper is not None:
+                    yield wrapper(row)
+                else:
+                    yield row
+
+            if len(rows) < limit:
+                return
+            if remaining is not None:
+                remaining -= len(rows)
+
+            params['startkey'] = startkey
+            if startkey_docid is not None:
+                params['startkey_docid'] = startkey_docid
+            params['skip'] = 1
+
     def first(self):
         """
         Return the first result of this query or None if the result doesn’t contain any row.
 
-        This results in an execution of the underlying query.
+        This results in an execution of the underlying query limited to one
+        row if the results haven't been fetched yet.
         """
-
-        try:
-            return list(self)[0]
-        except IndexError:
+        rows = self._fetch_rows(1)
+        if not rows:
             return None
+        return self._wrap_row(rows[0])
 
     def one(self, except_all=False):
         """
@@ -966,17 +1675,23 @@ class ViewResults(object):
         If except_all is True, raises `couchdbkit.exceptions.NoResultFound`
         if the query selects no rows.
 
-        This results in an execution of the underlying query.
+        This results in an execution of the underlying query limited to two
+        rows if the results haven't been fetched yet.
         """
+        rows = self._fetch_rows(2)
+        if len(rows) > 1:
+            raise MultipleResultsFound("%s results found." % len(rows))
+        elif not rows:
+            if except_all:
+                raise NoResultFound
+            return None
+        return self._wrap_row(rows[0])
 
-        length = len(self)
-        if length > 1:
-            raise MultipleResultsFound("%s results found." % length)
-
-        result = self.first()
-        if result is None and except_all:
-            raise NoResultFound
-        return result
+    def exists(self):
+        """ return True if the query returns at least one row. Only one row
+        is requested, without the documents, if the results haven't been
+        fetched yet. The row is kept, the query isn't executed again. """
+        return len(self._fetch_rows(1, include_docs=None)) > 0
 
     def all(self):
         """ return list of all results """
@@ -997,16 +1712,27 @@ class ViewResults(object):
                 pass
         self._dynamic_keys = []
 
-        self._result_cache = self.view._exec(**self.params).json_body
-        self._total_rows = self._result_cache.get('total_rows')
-        self._offset = self._result_cache.get('offset', 0)
+        self._result_cache = self.view._exec_json(**self.params)
+        self._total_rows = None
+        self._offset = 0
+        self._limited_rows = {}
+        self._set_meta(self._result_cache)
+
+    def _set_meta(self, result):
+        # a reduce view has no total_rows, it isn't requested again
+        self._meta_fetched = True
+        if 'total_rows' in result:
+            self._total_rows = result['total_rows']
+        if 'offset' in result:
+            self._offset = result['offset']
 
         # add key in view results that could be added by an external
         # like couchdb-lucene
-        for key in self._result_cache.keys():
+        for key in result.keys():
             if key not in ["total_rows", "offset", "rows"]:
-                self._dynamic_keys.append(key)
-                setattr(self, key, self._result_cache[key])
+                if key not in self._dynamic_keys:
+                    self._dynamic_keys.append(key)
+                setattr(self, key, result[key])
 
     def fetch_raw(self):
         """
@@ -1014,6 +1740,37 @@ class ViewResults(object):
         """
         return self.view._exec(**self.params)
 
+    def raw_body(self):
+        """ return the response of the query as a bytestring, without
+        decoding it """
+        return self.view._exec(**self.params).body_string()
+
+    def raw_stream(self):
+        """ return a file object reading the response of the query. Use
+        it in a `with` statement or close it to release the connection.
+        """
+        return self.view._exec(**self.params).body_stream()
+
+    def iter_raw_rows(self, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+        """ iterate over the rows while they are read from the response,
+        each row being the bytestring of its JSON. Rows aren't decoded nor
+        wrapped, they can be sent as is to a client.
+
+        @param chunk_size: int, size of the blocks read from the response.
+        """
+        resp = self.view._exec(**self.params)
+        body = resp.body_stream()
+        done = False
+        try:
+            for row in _iter_raw_view_rows(body, chunk_size=chunk_size):
+                yield row
+            done = True
+        finally:
+            if done:
+                body.close()
+            else:
+                resp.close()
+
     def _fetch_if_needed(self):
         if not self._result_cache:
             self.fetch()
@@ -1021,9 +1778,14 @@ class ViewResults(object):
     @property
     def total_rows(self):
         """
-        Return number of total rows in the view
+        Return number of total rows in the view. If the results haven't
+        been fetched yet, only the metadata are requested (limit=0), unless
+        the query is reduced.
         """
-        self._fetch_if_needed()
+        if self._is_reduced():
+            # a reduced result has no total_rows, count its rows
+            return self.count()
+        self._fetch_meta_if_needed()
         # reduce case, count number of lines
         if self._total_rows is None:
             return self.count()
@@ -1032,7 +1794,7 @@ class ViewResults(object):
     @property
     def offset(self):
         """ current position in the view """
-        self._fetch_if_needed()
+        self._fetch_meta_if_needed()
         return self._offset
 
     def __getitem__(self, key):
@@ -1047,7 +1809,7 @@ class ViewResults(object):
         else:
             params['key'] = key
 
-        return ViewResults(self.view, **params)
+        return ViewResults(self.view, stream=self.stream, **params)
 
     def __iter__(self):
         return self.iterator()
@@ -1056,7 +1818,7 @@ class ViewResults(object):
         return self.count()
 
     def __nonzero__(self):
-        return bool(len(self))
+        return self.exists()
 
 
 class ViewInterface(object):
@@ -1075,6 +1837,10 @@ class ViewInterface(object):
     def _exec(self, **params):
         raise NotImplementedError
 
+    def _exec_json(self, **params):
+        """ execute the query and return the decoded result """
+        return self._exec(**params).json_body
+
 
 class View(ViewInterface):
     """ Object used to wrap a view and return ViewResults.
@@ -1087,10 +1853,48 @@ class View(ViewInterface):
     def _exec(self, **params):
         if 'keys' in params:
             keys = params.pop('keys')
-            return self._db.res.post(self.view_path, payload={'keys': keys}, **params)
+            return self._db.res.post(self.view_path,
+                    payload=_json_payload({'keys': keys}, keys), **params)
         else:
             return self._db.res.get(self.view_path, **params)
 
+    def _exec_json(self, **params):
+        flights = self._db.single_flight
+        if flights is None and self._db.view_cache is None:
+            return self._exec(**params).json_body
+
+        query = dict((k, v) for k, v in params.items() if k != 'keys')
+        key = query_key("%s/%s" % (self._db.uri, self.view_path),
+                resource.encode_params(query), params.get('keys'))
+        if flights is None:
+            return self._fetch_json(key, params)
+        return flights.do(key, self._fetch_json, key, params)
+
+    def _fetch_json(self, key, params):
+        cache = self._db.view_cache
+        if cache is None:
+            return self._exec(**params).json_body
+
+        entry = cache.get(key)
+        if entry is not None:
+            if entry.is_fresh():
+                return cache.result(entry)
+            params['headers'] = {'If-None-Match': entry.etag}
+
+        resp = self._exec(**params)
+        body = resp.body_string()
+        if resp.status_int == 304:
+            cache.revalidated(key)
+            return cache.result(entry)
+
+        result = json_loads(body)
+        etag = resp['etag']
+        if etag:
+            cache.set(key, result, etag, size=len(body))
+            if cache.copy:
+                result = copy_json(result)
+        return result
+
 
 class TempView(ViewInterface):
     """ Object used to wrap a temporary and return ViewResults. """
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -
+#
+# This file is part of couchdbkit released under the MIT license.
+# See the NOTICE for more information.
+
+"""
+Route requests between the nodes of a CouchDB cluster::
+
+    from couchdbkit import Server
+    from couchdbkit.cluster import Cluster
+
+    s = Server(["http://node1:5984", "http://node2:5984",
+        "http://node3:5984"])
+
+    # or to configure the routing
+    s = Server(Cluster(["http://node1:5984", "http://node2:5984"],
+        strategy="ewma", write_to="primary"))
+
+    print s.cluster.stats()
+
+Reads (GET, HEAD and view queries) go to the node with the fewest
+requests in flight or the lowest latency. Writes go to the primary node or to any node. A
+node failing to answer is ejected for `eject_time` seconds, then a health
+check is sent to it in a background thread and it's used again once the
+check passes.
+"""
+
+from __future__ import with_statement
+
+import threading
+import time
+
+from restkit import util
+from restkit.errors import RequestError, RequestFailed, RequestTimeout
+
+from .resource import CouchdbResource
+
+__all__ = ['Node', 'Cluster', 'ClusterResource']
+
+DEFAULT_EWMA_ALPHA = 0.3
+DEFAULT_EJECT_AFTER = 3
+DEFAULT_EJECT_TIME = 30.0
+# latency recorded for a failed request, so a node failing fast, like one
+# refusing connections, doesn't get the lowest latency
+FAILURE_LATENCY = 1.0
+
+STRATEGIES = ('least_outstanding', 'ewma')
+
+
+class Node(object):
+    """ a node of the cluster and its stats """
+
+    def __init__(self, uri):
+        self.uri = uri.rstrip('/')
+        self.ewma = 0.0
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.failures = 0
+        self.ejected_until = None
+        self.checking = False
+
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__, self.uri)
+
+    @property
+    def ejected(self):
+        return self.ejected_until is not None
+
+    def stats(self):
+        return {
+            "uri": self.uri,
+            "latency": self.ewma,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejected": self.ejected
+        }
+
+
+class Cluster(object):
+    """ nodes of a cluster and the state used to route requests to them """
+
+    def __init__(self, uris, strategy='least_outstanding', primary=None,
+            write_to='primary', eject_after=DEFAULT_EJECT_AFTER,
+            eject_time=DEFAULT_EJECT_TIME, alpha=DEFAULT_EWMA_ALPHA,
+            health_check=None, client_opts=None):
+        """ Constructor for Cluster
+
+        @param uris: list of node uris
+        @param strategy: "least_outstanding" to send reads to the node
+        with fewest requests in flight or "ewma" to use the node with the
+        lowest latency, weighted by its requests in flight.
+        @param primary: uri of the node receiving writes, the first node
+        by default.
+        @param write_to: "primary" or "any". When "any", writes are
+        routed like reads. Writes go to another node while the primary is
+        ejected.
+        @param eject_after: int, number of consecutive failures after which
+        a node is ejected.
+        @param eject_time: float, number of seconds before a health check
+        is sent to an ejected node.
+        @param alpha: float, weight of the last request in the latency
+        average.
+        @param health_check: callable taking a node and returning True if
+        it's healthy. By default a GET on the node root must succeed.
+        @param client_opts: dict, options of the resource sending the
+        default health check (filters, transport, gzip...). The first
+        `ClusterResource` of the cluster sets them to its own when not
+        given, so the check is authenticated like the other requests.
+        """
+        if not uris:
+            raise ValueError("a cluster needs at least one node")
+        if strategy not in STRATEGIES:
+            raise ValueError("unknown strategy %r" % strategy)
+        if write_to not in ('primary', 'any'):
+            raise ValueError("write_to must be 'primary' or 'any'")
+
+        self.nodes = [Node(uri) for uri in uris]
+        self.uri = self.nodes[0].uri
+        self.primary = self.nodes[0]
+        if primary is not None:
+            primary = primary.rstrip('/')
+            for node in self.nodes:
+                if node.uri == primary:
+                    self.primary = node
+                    break
+            else:
+                raise ValueError("%s isn't a node of the cluster" % primary)
+
+        self.strategy = strategy
+        self.write_to = write_to
+        self.eject_after = eject_after
+        self.eject_time = eject_time
+        self.alpha = alpha
+        self.health_check = health_check or self._default_health_check
+        self.client_opts = client_opts
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """ return the stats of each node """
+        with self._lock:
+            return [node.stats() for node in self.nodes]
+
+    def pick(self, read=True, exclude=()):
+        """ select the node for a request and count it in flight.
+        Nodes in `exclude` are only used if there is no other choice. """
+        with self._lock:
+            self._check_ejected()
+            if not read and self.write_to == 'primary' and \
+                    not self.primary.ejected:
+                node = self.primary
+            else:
+                candidates = [n for n in self.nodes
+                        if not n.ejected and n not in exclude]
+                if not candidates:
+                    candidates = [n for n in self.nodes
+                            if n not in exclude] or self.nodes
+                node = min(candidates, key=self._score)
+            node.outstanding += 1
+            node.requests += 1
+            return node
+
+    def done(self, node, latency, failed=False):
+        """ record the end of a request sent to `node` """
+        with self._lock:
+            node.outstanding -= 1
+            if failed:
+                latency = max(latency, FAILURE_LATENCY)
+            node.ewma = self.alpha * latency + (1 - self.alpha) * node.ewma
+            if not failed:
+                node.failures = 0
+                return
+
+            node.errors += 1
+            node.failures += 1
+            if node.failures >= self.eject_after and not node.ejected:
+                node.ejected_until = time.time() + self.eject_time
+
+    def _score(self, node):
+        if self.strategy == 'ewma':
+            return (node.ewma * (node.outstanding + 1), node.outstanding)
+        return (node.outstanding, node.ewma)
+
+    def _check_ejected(self):
+        now = time.time()
+        for node in self.nodes:
+            if node.ejected and not node.checking and \
+                    node.ejected_until <= now:
+                node.checking = True
+                t = threading.Thread(target=self._run_health_check,
+                        args=(node,))
+                t.daemon = True
+                t.start()
+
+    def _run_health_check(self, node):
+        try:
+            healthy = self.health_check(node)
+        except Exception:
+            healthy = False
+
+        with self._lock:
+            node.checking = False
+            if healthy:
+                node.ejected_until = None
+                node.failures = 0
+            else:
+                node.ejected_until = time.time() + self.eject_time
+
+    def _default_health_check(self, node):
+        CouchdbResource(node.uri, **(self.client_opts or {})
+                ).get().body_string()
+        return True
+
+
+class ClusterResource(CouchdbResource):
+    """ `CouchdbResource` sending each request to a node of a `Cluster`.
+
+    The uri of the resource is built on the uri of the first node and
+    only its path is used. Reads (GET, HEAD and view queries) failing with
+    a connection error or a 5xx status are retried once on another node.
+    A hedged request is usually sent to another node since the node of
+    the first request has one more request in flight.
+    """
+
+    def __init__(self, uri="http://127.0.0.1:5984", cluster=None,
+            **client_opts):
+        if cluster is None:
+            cluster = Cluster([uri])
+        if not uri.startswith(cluster.uri):
+            raise ValueError("%s isn't an uri of the cluster" % uri)
+
+        self.cluster = cluster
+        self.path = uri[len(cluster.uri):]
+        self._resources = {}
+        CouchdbResource.__init__(self, uri=uri, **client_opts)
+        if cluster.client_opts is None:
+            cluster.client_opts = dict(self.initial['client_opts'],
+                    transport=self.transport, gzip=self.gzip)
+
+    def clone(self, **client_opts):
+        opts = self._resource_opts()
+        opts.update(client_opts)
+        return self.__class__(self.initial['uri'], cluster=self.cluster,
+                **opts)
+
+    def __call__(self, path):
+        uri = util.make_uri(self.initial['uri'], path, charset=self.charset,
+                safe=self.safe, encode_keys=self.encode_keys)
+        return self.__class__(uri, cluster=self.cluster,
+                **self._resource_opts())
+
+    def _request(self, method, path=None, payload=None, headers=None,
+            **params):
+        read = self._is_read(method, path)
+        tried = []
+        while True:
+            node = self.cluster.pick(read=read, exclude=tried)
+            tried.append(node)
+            res = self._node_resource(node)
+
+            start = time.time()
+            try:
+                resp = res.request(method, path=path, payload=payload,
+                        headers=headers and headers.copy(), **params)
+            except (RequestError, RequestTimeout):
+                self.cluster.done(node, time.time() - start, failed=True)
+                if self._can_retry(read, tried):
+                    continue
+                raise
+            except RequestFailed, e:
+                failed = e.status_int >= 500
+                self.cluster.done(node, time.time() - start, failed=failed)
+                if failed and self._can_retry(read, tried):
+                    continue
+                raise
+            except Exception:
+                # 4xx errors mapped by CouchdbResource
+                self.cluster.done(node, time.time() - start)
+                raise
+
+            self.cluster.done(node, time.time() - start)
+            return resp
+
+    def _is_read(self, method, path):
+        if method in ('GET', 'HEAD'):
+            return True
+        elif method == 'POST':
+            # views queried with keys
+            path = "%s/%s" % (self.path, path or "")
+            return '/_view/' in path or path.rstrip('/').endswith('_all_docs')
+        return False
+
+    def _can_retry(self, read, tried):
+        return read and len(tried) == 1 and len(self.cluster.nodes) > 1
+
+    def _node_resource(self, node):
+        res = self._resources.get(node.uri)
+        if res is None:
+            res = CouchdbResource(node.uri + self.path,
+                    transport=self.transport, gzip=self.gzip,
+                    **self.initial['client_opts'])
+            self._resources[node.uri] = res
+        return res
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -
+#
+# This file is part of couchdbkit released under the MIT license.
+# See the NOTICE for more information.
+
+"""
+gzip compression of the requests and responses::
+
+    from couchdbkit import Server
+    from couchdbkit.compression import GzipPolicy
+
+    s = Server(gzip=GzipPolicy(compress_requests=True, threshold=16384))
+    print s.res.gzip.stats()
+
+Responses are requested with `Accept-Encoding: gzip` and decompressed
+while they are read. JSON request bodies larger than `threshold`, like
+`_bulk_docs` or views queried with `keys`, are compressed when
+`compress_requests` is True. Bodies streamed with `JSONPayload` are
+always large and are compressed while they are sent. If the server
+answers 415 to a compressed request, compression of requests is
+disabled and the request is sent again uncompressed.
+"""
+
+from __future__ import with_statement
+
+import threading
+import time
+import zlib
+
+from .transport import ResponseBody
+
+__all__ = ['GzipPolicy']
+
+DEFAULT_GZIP_THRESHOLD = 16 * 1024
+DEFAULT_GZIP_LEVEL = 6
+
+
+class GzipPolicy(object):
+    """ restkit filter compressing the requests and decompressing the
+    responses, and counting the bytes saved """
+
+    def __init__(self, accept=True, compress_requests=False,
+            threshold=DEFAULT_GZIP_THRESHOLD, level=DEFAULT_GZIP_LEVEL):
+        """ Constructor for GzipPolicy
+
+        @param accept: boolean, if True gzip responses are accepted
+        @param compress_requests: boolean, if True JSON bodies larger
+        than `threshold` are compressed
+        @param threshold: int, min size in bytes of a compressed body
+        @param level: int, compression level from 1 to 9
+        """
+        self.accept = accept
+        self.compress_requests = compress_requests
+        self.threshold = threshold
+        self.level = level
+
+        self._lock = threading.Lock()
+        self.requests_compressed = 0
+        self.request_bytes = 0
+        self.request_bytes_sent = 0
+        self.compress_time = 0.0
+        self.responses_compressed = 0
+        self.response_bytes = 0
+        self.response_bytes_received = 0
+        self.decompress_time = 0.0
+        self.rejected = 0
+
+    def stats(self):
+        """ return a dict of the compression counters. Ratios are the
+        compressed size divided by the original size. """
+        with self._lock:
+            return {
+                "requests_compressed": self.requests_compressed,
+                "request_bytes": self.request_bytes,
+                "request_bytes_sent": self.request_bytes_sent,
+                "request_ratio": _ratio(self.request_bytes_sent,
+                    self.request_bytes),
+                "compress_time": self.compress_time,
+                "responses_compressed": self.responses_compressed,
+                "response_bytes": self.response_bytes,
+                "response_bytes_received": self.response_bytes_received,
+                "response_ratio": _ratio(self.response_bytes_received,
+                    self.response_bytes),
+                "decompress_time": self.decompress_time,
+                "rejected": self.rejected
+            }
+
+    def on_request(self, request):
+        if self.accept and request.headers.iget('accept-encoding') is None:
+            request.headers['Accept-Encoding'] = 'gzip'
+
+        body = request.body
+        if not self.compress_requests or body is None or \
+                request.headers.iget('content-encoding') is not None:
+            return
+        ctype = request.headers.iget('content-type') or ''
+        if not ctype.startswith('application/json'):
+            return
+
+        if hasattr(body, 'read') and hasattr(body, 'seek') and \
+                request.is_chunked():
+            # a streamed body, like a large `_bulk_docs` payload, is
+            # compressed while it's sent
+            request.body = GzipStream(body, self, self.level)
+            request.headers['Content-Encoding'] = 'gzip'
+            with self._lock:
+                self.requests_compressed += 1
+            return
+
+        if not isinstance(body, str) or len(body) < self.threshold:
+            return
+
+        start = time.time()
+        compressed = compress(body, self.level)
+        elapsed = time.time() - start
+
+        # Content-Length is computed again from the new body
+        request.headers.ipop('content-length', None)
+        request.body = compressed
+        request.headers['Content-Encoding'] = 'gzip'
+        with self._lock:
+            self.requests_compressed += 1
+            self.request_bytes += len(body)
+            self.request_bytes_sent += len(compressed)
+            self.compress_time += elapsed
+
+    def on_response(self, response, request):
+        encoding = response.headers.get('Content-Encoding')
+        if not encoding or encoding.lower() not in ('gzip', 'x-gzip') or \
+                request.method == 'HEAD':
+            return
+        with self._lock:
+            self.responses_compressed += 1
+        response._body = ResponseBody(GzipReader(response._body, self).read)
+
+    def rejects(self, response):
+        """ return True if `response` is a server refusing a compressed
+        request. Compression of requests is disabled then. """
+        if response is None or response.status_int != 415:
+            return False
+        request = getattr(response, 'request', None)
+        if request is None or \
+                request.headers.iget('content-encoding') != 'gzip':
+            return False
+        with self._lock:
+            self.compress_requests = False
+            self.rejected += 1
+        return True
+
+    def _record_request(self, size, sent, elapsed):
+        with self._lock:
+            self.request_bytes += size
+            self.request_bytes_sent += sent
+            self.compress_time += elapsed
+
+    def _record_response(self, received, size, elapsed):
+        with self._lock:
+            self.response_bytes_received += received
+            self.response_bytes += size
+            self.decompress_time += elapsed
+
+
+class GzipStream(object):
+    """ compress a stream in the gzip format while it's read """
+
+    def __init__(self, fp, policy=None, level=DEFAULT_GZIP_LEVEL,
+            chunk_size=16384):
+        self.fp = fp
+        self.policy = policy
+        self.level = level
+        self.chunk_size = chunk_size
+        self.seek(0)
+
+    def seek(self, offset, whence=0):
+        if offset != 0 or whence != 0:
+            raise IOError("a gzip stream can only be read again from the "
+                    "beginning")
+        self.fp.seek(0)
+        self._compressor = zlib.compressobj(self.level, zlib.DEFLATED,
+                16 + zlib.MAX_WBITS)
+        self._buf = ""
+        self._eof = False
+
+    def read(self, size=-1):
+        buf = [self._buf]
+        length = len(self._buf)
+        while not self._eof and (size is None or size < 0 or length < size):
+            data = self.fp.read(self.chunk_size)
+            start = time.time()
+            if data:
+                out = self._compressor.compress(data)
+            else:
+                self._eof = True
+                out = self._compressor.flush()
+            if self.policy is not None:
+                self.policy._record_request(len(data), len(out),
+                        time.time() - start)
+            buf.append(out)
+            length += len(out)
+
+        data = "".join(buf)
+        if size is None or size < 0:
+            self._buf = ""
+            return data
+        data, self._buf = data[:size], data[size:]
+        return data
+
+
+class GzipReader(object):
+    """ decompress a gzip stream while it's read """
+
+    def __init__(self, fp, policy=None, chunk_size=16384):
+        self.fp = fp
+        self.policy = policy
+        self.chunk_size = chunk_size
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._eof = False
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.chunk_size
+        while not self._eof:
+            data = self.fp.read(max(size, self.chunk_size))
+            start = time.time()
+            if data:
+                out = self._decompressor.decompress(data)
+            else:
+                self._eof = True
+                out = self._decompressor.flush()
+            if self.policy is not None:
+                self.policy._record_response(len(data), len(out),
+                        time.time() - start)
+            if out:
+                return out
+        return ""
+
+
+def compress(data, level=DEFAULT_GZIP_LEVEL):
+    """ return `data` compressed in the gzip format """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _ratio(compressed, size):
+    if not size:
+        return None
+    return float(compressed) / size
@@ -13,7 +13,7 @@ class ConsumerBase(object):
         self.db = db
 
     def fetch(self, cb=None, **params):
-        resp = self.db.res.get("_changes", **params)
+        resp = self.db.changes_res.get("_changes", **params)
         if cb is not None:
             check_callable(cb)
             cb(resp.json_body)
@@ -10,7 +10,7 @@ from eventlet import event
 
 from .base import check_callable
 from .sync import SyncConsumer
-from ..utils import json
+from ..utils import json_loads
 
 
 class ChangeConsumer(object):
@@ -30,7 +30,7 @@ class ChangeConsumer(object):
     def _run(self):
         while True:
             try:
-                resp = self.db.res.get("_changes", **self.params)
+                resp = self.db.changes_res.get("_changes", **self.params)
                 return self.consume(resp)
             except (SystemExit, KeyboardInterrupt):
                 eventlet.sleep(5)
@@ -74,7 +74,7 @@ class LongPollChangeConsumer(ChangeConsumer):
                 buf.append(data)
             change = "".join(buf)
             try:
-                change = json.loads(change)
+                change = json_loads(change)
             except ValueError:
                 pass 
             self.process_change(change)
@@ -87,7 +87,7 @@ class EventletConsumer(SyncConsumer):
         super(EventletConsumer, self).__init__(db)
 
     def _fetch(self, cb, **params):
-        resp = self.db.res.get("_changes", **params)
+        resp = self.db.changes_res.get("_changes", **params)
         cb(resp.json_body)
 
     def fetch(self, cb=None, **params):
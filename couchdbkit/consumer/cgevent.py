@@ -10,7 +10,7 @@ from gevent import monkey
 
 from .base import check_callable
 from .sync import SyncConsumer
-from ..utils import json
+from ..utils import json_loads
 
 class ChangeConsumer(gevent.Greenlet):
     def __init__(self, db, callback=None, **params):
@@ -22,7 +22,7 @@ class ChangeConsumer(gevent.Greenlet):
     def _run(self):
         while True:
             try:
-                resp = self.db.res.get("_changes", **self.params)
+                resp = self.db.changes_res.get("_changes", **self.params)
                 return self.consume(resp)
             except (SystemExit, KeyboardInterrupt):
                 gevent.sleep(5)
@@ -61,7 +61,7 @@ class LongPollChangeConsumer(ChangeConsumer):
                 buf.append(data)
             change = "".join(buf)
             try:
-                change = json.loads(change)
+                change = json_loads(change)
             except ValueError:
                 pass 
             self.process_change(change)
@@ -73,7 +73,7 @@ class GeventConsumer(SyncConsumer):
         super(GeventConsumer, self).__init__(db)
 
     def _fetch(self, cb, **params):
-        resp = self.db.res.get("_changes", **params)
+        resp = self.db.changes_res.get("_changes", **params)
         cb(resp.json_body)
 
     def fetch(self, cb=None, **params):
@@ -6,7 +6,7 @@
 from __future__ import with_statement
 
 from .base import ConsumerBase, check_callable
-from ..utils import json
+from ..utils import json_loads
 
 __all__ = ['SyncConsumer']
 
@@ -17,7 +17,7 @@ class SyncConsumer(ConsumerBase):
             check_callable(cb)
 
         params.update({"feed": "longpoll"})
-        resp = self.db.res.get("_changes", **params)
+        resp = self.db.changes_res.get("_changes", **params)
         buf = ""
         with resp.body_stream() as body:
             while True:
@@ -26,7 +26,7 @@ class SyncConsumer(ConsumerBase):
                     break
                 buf += data
             
-            ret = json.loads(buf)
+            ret = json_loads(buf)
             if cb is not None:
                 cb(ret)
                 return
@@ -36,7 +36,7 @@ class SyncConsumer(ConsumerBase):
     def wait(self, cb, **params):
         check_callable(cb)
         params.update({"feed": "continuous"})
-        resp = self.db.res.get("_changes", **params)
+        resp = self.db.changes_res.get("_changes", **params)
 
         with resp.body_stream() as body:
             while True:
@@ -51,6 +51,6 @@ class SyncConsumer(ConsumerBase):
                     if not line:
                         continue
 
-                    cb(json.loads(line))
+                    cb(json_loads(line))
                 except (KeyboardInterrupt, SystemExit,):
                     break
@@ -45,7 +45,8 @@ class FSDoc(object):
         if os.path.exists(ignorefile):
             # A .couchappignore file is a json file containing a
             # list of regexps for things to skip
-            self.ignores = utils.json.load(open(ignorefile, 'r'))
+            with open(ignorefile, 'rb') as f:
+                self.ignores = utils.json_load(f)
         if not docid:
             docid = self.get_id()
         self.docid = docid
@@ -71,7 +72,7 @@ class FSDoc(object):
         return "<%s (%s/%s)>" % (self.__class__.__name__, self.docdir, self.docid)
 
     def __str__(self):
-        return utils.json.dumps(self.doc())
+        return utils.json_dumps(self.doc())
 
     def create(self):
         if not os.path.isdir(self.docdir):
@@ -571,7 +572,7 @@ def clone(db, docid, dest=None, rev=None):
                             content = base64.b64decode(content[15:])
 
                     if fname.endswith('.json'):
-                        content = utils.json.dumps(content).encode('utf-8')
+                        content = utils.json_dumps(content)
 
                     del v[last_key]
 
@@ -38,7 +38,7 @@ import os
 import re
 
 from ..exceptions import MacroError
-from ..utils import read_file, read_json, to_bytestring, json
+from ..utils import read_file, read_json, to_bytestring, json_dumps
 
 logger = logging.getLogger(__name__)
 
@@ -155,6 +155,6 @@ def run_json_macros(doc, f_string, app_dir):
        return f_string
 
    for k, v in included.iteritems():
-       varstrings.append("var %s = %s;" % (k, json.dumps(v).encode('utf-8')))
+       varstrings.append("var %s = %s;" % (k, json_dumps(v).decode('utf-8')))
 
    return re_json.sub(rjson2, f_string)
@@ -45,6 +45,14 @@ class BulkSaveError(Exception):
         self.errors = errors
         self.results = results
 
+class ResultTimeout(Exception):
+    "Exception raised when waiting for the result of an operation times out"
+    pass
+
+class RequestAborted(Exception):
+    "Exception raised in a request aborted because a hedged request answered first"
+    pass
+
 class ViewServerError(Exception):
     "Exception raised by view server"
     pass
@@ -5,7 +5,7 @@
 
 import sys
 
-from .utils import json
+from .utils import json_dumps, json_loads
 
 class External(object):
     """ simple class to handle an external
@@ -14,13 +14,13 @@ class External(object):
     example:
     
         from couchdbkit.external import External
-        from couchdbkit.utils import json 
+        from couchdbkit.utils import json_dumps
 
         class Test(External):
 
             def handle_line(self, line):
                 self.send_response(200, 
-                    "got message external object %s" % json.dumps(line),
+                    "got message external object %s" % json_dumps(line),
                     {"Content-type": "text/plain"})
 
         if __name__ == "__main__":
@@ -42,7 +42,7 @@ class External(object):
     def lines(self):
         line = self.stdin.readline()
         while line:
-            yield json.loads(line)
+            yield json_loads(line)
             line = self.stdin.readline()
     
     def run(self):
@@ -55,4 +55,4 @@ class External(object):
             'body': body, 
             'headers': headers
         }
-        self.write(json.dumps(resp))
+        self.write(json_dumps(resp))
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -
+#
+# This file is part of couchdbkit released under the MIT license.
+# See the NOTICE for more information.
+
+"""
+Hedged requests. When a read hasn't been answered after a delay, the same
+request is sent again on another connection, or to another node of a
+cluster, and the first response is used::
+
+    from couchdbkit import Server
+    from couchdbkit.hedge import HedgePolicy
+
+    s = Server(hedge=HedgePolicy(percentile=95, budget=0.05))
+    print s.res.hedge.stats()
+
+Only GET and HEAD requests are hedged. The delay is the given percentile
+of the latencies of the last requests, and hedges are limited to
+`budget` times the number of requests.
+
+The first request is sent by the calling thread, a hedge is sent by a
+background thread once the delay has passed. The request answering last
+is aborted by shutting down its connection, which the connection pools
+of `Server` and `couchdbkit.transport.HTTPTransport` allow. With other
+transports its response is closed when it arrives.
+"""
+
+from __future__ import with_statement
+
+from collections import deque
+import heapq
+import itertools
+import logging
+import socket
+import sys
+import threading
+import time
+
+from .exceptions import RequestAborted
+from .workers import Executor
+
+__all__ = ['HedgePolicy', 'check_aborted', 'track_connection', 'is_aborted']
+
+DEFAULT_HEDGE_PERCENTILE = 95
+DEFAULT_HEDGE_BUDGET = 0.05
+DEFAULT_HEDGE_MIN_DELAY = 0.005
+DEFAULT_HEDGE_WINDOW = 1000
+DEFAULT_HEDGE_MIN_SAMPLES = 100
+DEFAULT_HEDGE_WORKERS = 64
+
+# number of requests after which the delay is computed again
+UPDATE_DELAY_EVERY = 50
+
+logger = logging.getLogger(__name__)
+
+# attempt of a hedged call sent by the current thread
+_local = threading.local()
+
+
+def check_aborted():
+    """ raise `RequestAborted` if the request sent by the current thread
+    is a hedged attempt which has been aborted """
+    attempt = getattr(_local, 'attempt', None)
+    if attempt is not None and attempt.aborted:
+        raise RequestAborted("a hedged request answered first")
+
+
+def track_connection(conn):
+    """ register `conn` as used by the request sent by the current thread,
+    so it can be aborted. Called by the pools and transports when they
+    give a connection to a request. """
+    attempt = getattr(_local, 'attempt', None)
+    if attempt is not None:
+        attempt.add(conn)
+
+
+def is_aborted(conn):
+    """ return True if `conn` has been shut down to abort a request """
+    return getattr(conn, '_couchdbkit_aborted', False)
+
+
+def _abort_connection(conn):
+    conn._couchdbkit_aborted = True
+    # restkit connections or httplib connections
+    sock = getattr(conn, 'sock', None)
+    if sock is None and hasattr(conn, 'socket'):
+        sock = conn.socket()
+    if sock is None:
+        return
+    try:
+        # wake up the thread reading the response
+        sock.shutdown(socket.SHUT_RDWR)
+    except Exception:
+        pass
+
+
+def _close(resp):
+    try:
+        resp.close()
+    except Exception:
+        pass
+
+
+class _Attempt(object):
+    """ connections used by one of the requests of a hedged call """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conns = []
+        self.aborted = False
+
+    def add(self, conn):
+        with self._lock:
+            if not self.aborted:
+                self._conns.append(conn)
+                return
+        _abort_connection(conn)
+
+    def abort(self):
+        with self._lock:
+            self.aborted = True
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            _abort_connection(conn)
+
+
+class _Race(object):
+    """ the request and the hedge of a call, the first response wins """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request = _Attempt()
+        self.hedge = _Attempt()
+        self.winner = None
+        self.result = None
+
+    def finish(self, attempt, resp=None):
+        """ return True if `attempt` is the first to finish """
+        with self._lock:
+            if self.winner is not None:
+                return False
+            self.winner = attempt
+            self.result = resp
+            return True
+
+
+class _Timer(object):
+    """ thread calling functions once their time has come """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []
+        self._counter = itertools.count()
+        self._thread = None
+
+    def schedule(self, when, fn, *args):
+        entry = [when, next(self._counter), fn, args]
+        with self._cond:
+            heapq.heappush(self._heap, entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            elif self._heap[0] is entry:
+                self._cond.notify()
+        return entry
+
+    def cancel(self, entry):
+        # dropped by the thread when its time comes
+        entry[2] = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    while self._heap and self._heap[0][2] is None:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    timeout = self._heap[0][0] - time.time()
+                    if timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                when, i, fn, args = heapq.heappop(self._heap)
+
+            if fn is not None:
+                try:
+                    fn(*args)
+                except Exception:
+                    logger.exception("error while starting a hedged request")
+
+
+class HedgePolicy(object):
+    """ policy deciding when a request is hedged """
+
+    def __init__(self, percentile=DEFAULT_HEDGE_PERCENTILE,
+            budget=DEFAULT_HEDGE_BUDGET, min_delay=DEFAULT_HEDGE_MIN_DELAY,
+            window=DEFAULT_HEDGE_WINDOW, min_samples=DEFAULT_HEDGE_MIN_SAMPLES,
+            max_workers=DEFAULT_HEDGE_WORKERS):
+        """ Constructor for HedgePolicy
+
+        @param percentile: float, percentile of the latencies after which
+        a request is hedged
+        @param budget: float, max ratio of hedged requests
+        @param min_delay: float, min number of seconds before hedging
+        @param window: int, number of latencies kept to compute the delay
+        @param min_samples: int, no request is hedged before this number
+        of latencies is known
+        @param max_workers: int, max number of threads sending hedges
+        """
+        self.percentile = percentile
+        self.budget = budget
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.executor = Executor(max_workers=max_workers)
+        self._timer = _Timer()
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._delay = None
+        self._samples_since_update = 0
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.denied = 0
+
+    def stats(self):
+        """ return a dict of the hedging counters """
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "denied": self.denied,
+            "delay": self._delay
+        }
+
+    @property
+    def delay(self):
+        """ current delay before hedging, None while there is not enough
+        samples """
+        return self._delay
+
+    def call(self, send):
+        """ call `send` to get a response, and call it again in another
+        thread if it takes longer than the current delay. Return the
+        first response, or raise the error of the first call. An error of
+        the hedge is ignored while the first call is running. """
+        with self._lock:
+            self.requests += 1
+            delay = self._delay
+
+        start = time.time()
+        if delay is None:
+            resp = send()
+            self._record(time.time() - start)
+            return resp
+
+        race = _Race()
+        entry = self._timer.schedule(start + delay, self._start_hedge, race,
+                send)
+        _local.attempt = race.request
+        try:
+            try:
+                resp = send()
+                exc_info = None
+            except Exception:
+                resp = None
+                exc_info = sys.exc_info()
+        finally:
+            _local.attempt = None
+        self._timer.cancel(entry)
+
+        if race.finish(0, resp):
+            race.hedge.abort()
+            if exc_info is None:
+                self._record(time.time() - start)
+        else:
+            # the hedge answered first and aborted this request
+            if resp is not None:
+                _close(resp)
+            resp, exc_info = race.result, None
+            with self._lock:
+                self.hedge_wins += 1
+
+        if exc_info is not None:
+            exc_type, exc_value, tb = exc_info
+            raise exc_type, exc_value, tb
+        return resp
+
+    def _start_hedge(self, race, send):
+        if race.winner is None and self._take_budget():
+            self.executor.submit(self._hedge, race, send)
+
+    def _hedge(self, race, send):
+        start = time.time()
+        _local.attempt = race.hedge
+        try:
+            try:
+                resp = send()
+            except Exception:
+                return
+        finally:
+            _local.attempt = None
+
+        self._record(time.time() - start)
+        if race.finish(1, resp):
+            race.request.abort()
+        else:
+            _close(resp)
+
+    def _take_budget(self):
+        with self._lock:
+            if self.hedged + 1 > self.budget * self.requests:
+                self.denied += 1
+                return False
+            self.hedged += 1
+            return True
+
+    def _record(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+            self._samples_since_update += 1
+            if len(self._latencies) < self.min_samples:
+                return
+            if self._delay is not None and \
+                    self._samples_since_update < UPDATE_DELAY_EVERY:
+                return
+
+            latencies = sorted(self._latencies)
+            idx = int(len(latencies) * self.percentile / 100.0)
+            self._delay = max(self.min_delay,
+                    latencies[min(idx, len(latencies) - 1)])
+            self._samples_since_update = 0
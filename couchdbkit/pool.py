@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -
+#
+# This file is part of couchdbkit released under the MIT license.
+# See the NOTICE for more information.
+
+"""
+Connection pools used by `Server`::
+
+    from couchdbkit import Server
+
+    s = Server(pool_size=20, max_connections=50, idle_timeout=30,
+        warm_connections=5)
+    print s.pool_stats()
+
+Requests to the `_changes` feed use their own pool, so long-lived
+connections of continuous feeds don't take connections from other
+requests.
+"""
+
+from __future__ import with_statement
+
+import threading
+import time
+import weakref
+
+from restkit.conn import Connection
+from socketpool import ConnectionPool
+
+from .exceptions import RequestAborted
+from .hedge import check_aborted, is_aborted, track_connection
+
+__all__ = ['CouchdbPool', 'get_default_pool']
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_IDLE_TIMEOUT = 300.0
+DEFAULT_WAIT_TIMEOUT = 10.0
+
+# max seconds between two checks while waiting for a connection, a
+# connection closed after an error may not be released
+WAIT_INTERVAL = 1.0
+
+_default_pools = {}
+
+
+def get_default_pool(backend="thread", name="default"):
+    """ return the pool shared by the servers using the default options """
+    key = (backend, name)
+    pool = _default_pools.get(key)
+    if pool is None:
+        pool = _default_pools[key] = CouchdbPool(backend=backend)
+    return pool
+
+
+class CouchdbPool(ConnectionPool):
+    """ `socketpool.ConnectionPool` of restkit connections, with a limit
+    of connections in use per host, an idle timeout and statistics.
+    """
+
+    def __init__(self, max_size=DEFAULT_POOL_SIZE, max_connections=None,
+            idle_timeout=DEFAULT_IDLE_TIMEOUT,
+            wait_timeout=DEFAULT_WAIT_TIMEOUT, backend="thread", **options):
+        """ Constructor for CouchdbPool
+
+        @param max_size: int, max number of idle connections kept
+        @param max_connections: int, max number of connections in use per
+        host. When the limit is reached, requests wait for a connection.
+        With the gevent or eventlet backend, the process must be monkey
+        patched for this wait.
+        @param idle_timeout: float, number of seconds an idle connection
+        is kept.
+        @param wait_timeout: float, max number of seconds a request waits
+        for a connection. After that a connection is created anyway and
+        counted in the `overflows` stat.
+        @param backend: str, socketpool backend: thread, gevent or eventlet
+        @param options: other `socketpool.ConnectionPool` options
+        """
+        ConnectionPool.__init__(self, factory=Connection, max_size=max_size,
+                backend=backend, **options)
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+
+        self._lock = self.backend_mod.Semaphore(1)
+        # notified when a connection is released
+        self._released = threading.Condition()
+        self._in_use = weakref.WeakValueDictionary()
+        self._dropped = {}
+        self.connects = 0
+        self.reconnects = 0
+        self.closed = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.overflows = 0
+
+    def stats(self):
+        """ return a dict of the pool statistics:
+
+        - in_use: connections used by a request
+        - idle: connections kept in the pool
+        - connects: connections opened
+        - reconnects: connections opened to replace a dropped one
+        - closed: connections dropped, because they were idle for too
+        long, closed by the server or after an error
+        - waits, wait_time: number of requests which waited for a
+        connection and total time they waited
+        - overflows: connections opened above `max_connections`
+        """
+        return {
+            "in_use": len(self._in_use),
+            "idle": self.size,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "closed": self.closed,
+            "waits": self.waits,
+            "wait_time": self.wait_time,
+            "overflows": self.overflows
+        }
+
+    def warm(self, host, port, count, is_ssl=False, **ssl_args):
+        """ open connections until `count` connections to the host are
+        idle in the pool """
+        conns = []
+        try:
+            for i in range(count):
+                conns.append(self.get(host=host, port=port, pool=self,
+                    is_ssl=is_ssl, extra_headers=[], **ssl_args))
+        finally:
+            for conn in conns:
+                self.release_connection(conn)
+
+    def get(self, **options):
+        check_aborted()
+        key = (options.get('host'), options.get('port'))
+        if self.max_connections is not None:
+            self._wait_for_connection(key)
+
+        conn = ConnectionPool.get(self, **options)
+        with self._lock:
+            if getattr(conn, '_couchdbkit_key', None) is None:
+                conn._couchdbkit_key = key
+                self.connects += 1
+                if self._dropped.get(key):
+                    self._dropped[key] -= 1
+                    self.reconnects += 1
+            self._in_use[id(conn)] = conn
+        track_connection(conn)
+        return conn
+
+    def release_connection(self, conn):
+        with self._lock:
+            self._in_use.pop(id(conn), None)
+        aborted = is_aborted(conn)
+        if aborted:
+            conn.invalidate()
+        conn._idle_since = time.time()
+        ConnectionPool.release_connection(self, conn)
+        if self.max_connections is not None:
+            with self._released:
+                self._released.notify_all()
+        if aborted:
+            # restkit releases the connection before trying the request
+            # again, stop the aborted request there
+            raise RequestAborted("a hedged request answered first")
+
+    def too_old(self, conn):
+        idle_since = getattr(conn, '_idle_since', None)
+        if idle_since is not None and self.idle_timeout is not None and \
+                time.time() - idle_since > self.idle_timeout:
+            return True
+        return ConnectionPool.too_old(self, conn)
+
+    def _reap_connection(self, conn):
+        with self._lock:
+            self.closed += 1
+            key = getattr(conn, '_couchdbkit_key', None)
+            self._dropped[key] = self._dropped.get(key, 0) + 1
+        ConnectionPool._reap_connection(self, conn)
+
+    def _count_in_use(self, key):
+        count = 0
+        for conn in self._in_use.values():
+            if getattr(conn, '_couchdbkit_key', None) != key:
+                continue
+            if not conn._connected:
+                # closed after an error without being released
+                self._in_use.pop(id(conn), None)
+                continue
+            count += 1
+        return count
+
+    def _wait_for_connection(self, key):
+        start = None
+        with self._released:
+            while True:
+                with self._lock:
+                    if self._count_in_use(key) < self.max_connections:
+                        break
+
+                now = time.time()
+                if start is None:
+                    start = now
+                remaining = self.wait_timeout - (now - start)
+                if remaining <= 0:
+                    with self._lock:
+                        self.overflows += 1
+                    break
+                self._released.wait(min(remaining, WAIT_INTERVAL))
+
+        if start is not None:
+            with self._lock:
+                self.waits += 1
+                self.wait_time += time.time() - start
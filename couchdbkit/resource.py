@@ -24,14 +24,15 @@ import re
 
 from restkit import Resource, Response
 from restkit.errors import ResourceError, RequestFailed, RequestError
-from restkit.util import url_quote
+from restkit.util import make_uri, url_quote
 
 from . import __version__
 from .exceptions import ResourceNotFound, ResourceConflict, \
 PreconditionFailed
-from .utils import json
+from .utils import json_dumps, json_iterencode, json_loads
 
 USER_AGENT = 'couchdbkit/%s' % __version__
+DEFAULT_PAYLOAD_CHUNK_SIZE = 65536
 
 RequestFailed = RequestFailed
 
@@ -49,8 +50,8 @@ class JSONResponse(Response):
         if not self.can_read():
             raise AlreadyRead()
 
-        # try to decode json
-        body = json.load(self._body)
+        # try to decode json, from the bytes of the body
+        body = json_loads(self._body.read())
         self._already_read = True
 
         # release connection
@@ -59,19 +60,116 @@ class JSONResponse(Response):
         return body
 
 
+class JSONPayload(object):
+    """ file object encoding a JSON request body while it's read, so only
+    a chunk of the body is in memory. Lists in the object, like the docs
+    of a `_bulk_docs` request, are encoded item by item.
+
+    The body is sent with chunked transfer encoding, or with a
+    Content-Length computed by encoding the object twice if `chunked` is
+    False.
+    """
+
+    def __init__(self, obj, chunk_size=DEFAULT_PAYLOAD_CHUNK_SIZE,
+            chunked=True):
+        self.obj = obj
+        self.chunk_size = chunk_size
+        self.chunked = chunked
+        self._size = None
+        self.seek(0)
+
+    def headers(self):
+        """ return the headers describing the body """
+        headers = {'Content-Type': 'application/json'}
+        if self.chunked:
+            headers['Transfer-Encoding'] = 'chunked'
+        else:
+            headers['Content-Length'] = str(self.size())
+        return headers
+
+    def size(self):
+        """ length of the encoded body """
+        if self._size is None:
+            self._size = sum(len(piece) for piece in json_iterencode(self.obj))
+        return self._size
+
+    def seek(self, offset, whence=0):
+        if offset != 0 or whence != 0:
+            raise IOError("a JSON payload can only be read again from the "
+                    "beginning")
+        self._pieces = json_iterencode(self.obj)
+        self._buf = ""
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self._buf + "".join(self._pieces)
+            self._buf = ""
+            return data
+
+        buf = [self._buf]
+        length = len(self._buf)
+        for piece in self._pieces:
+            buf.append(piece)
+            length += len(piece)
+            if length >= size:
+                break
+        data = "".join(buf)
+        data, self._buf = data[:size], data[size:]
+        return data
+
+
 class CouchdbResource(Resource):
 
-    def __init__(self, uri="http://127.0.0.1:5984", **client_opts):
+    def __init__(self, uri="http://127.0.0.1:5984", hedge=None,
+            transport=None, gzip=None, **client_opts):
         """Constructor for a `CouchdbResource` object.
 
         CouchdbResource represent an HTTP resource to CouchDB.
 
         @param uri: str, full uri to the server.
+        @param hedge: `couchdbkit.hedge.HedgePolicy` instance. If set,
+        GET and HEAD requests are hedged.
+        @param transport: a transport instance or name used to send the
+        requests instead of the restkit client. See `couchdbkit.transport`.
+        @param gzip: `couchdbkit.compression.GzipPolicy` instance. If set,
+        responses are accepted compressed and large requests may be
+        compressed.
         """
         client_opts['response_class'] = JSONResponse
+        if gzip is not None:
+            filters = list(client_opts.get('filters') or [])
+            if gzip not in filters:
+                filters.append(gzip)
+            client_opts['filters'] = filters
+            # the responses are decompressed by the filter
+            client_opts['decompress'] = False
 
         Resource.__init__(self, uri=uri, **client_opts)
         self.safe = ":/%"
+        self.hedge = hedge
+        self.transport = transport
+        self.gzip = gzip
+        if transport is not None:
+            from .transport import TransportClient
+            self.client = TransportClient(transport,
+                    filters=self.client_opts.get('filters'))
+
+    def _resource_opts(self):
+        """ options given to the resources created from this one """
+        return dict(self.initial['client_opts'], hedge=self.hedge,
+                transport=self.transport, gzip=self.gzip)
+
+    def clone(self, **client_opts):
+        """ return a copy of this resource. `client_opts` override its
+        options. """
+        opts = self._resource_opts()
+        opts.update(client_opts)
+        return self.__class__(self.initial['uri'], **opts)
+
+    def __call__(self, path):
+        uri = make_uri(self.initial['uri'], path, charset=self.charset,
+                safe=self.safe, encode_keys=self.encode_keys)
+        return type(self)(uri, **self._resource_opts())
 
     def copy(self, path=None, headers=None, **params):
         """ add copy to HTTP verbs """
@@ -105,26 +203,47 @@ class CouchdbResource(Resource):
         @return: tuple (data, resp), where resp is an `httplib2.Response`
             object and data a python object (often a dict).
         """
-
+        if self.hedge is not None and method in ('GET', 'HEAD') and \
+                payload is None:
+            def send():
+                return self._request(method, path=path,
+                        headers=dict(headers or {}), **params)
+            return self.hedge.call(send)
+        return self._request(method, path=path, payload=payload,
+                headers=headers, **params)
+
+    def _request(self, method, path=None, payload=None, headers=None,
+            **params):
         headers = headers or {}
         headers.setdefault('Accept', 'application/json')
         headers.setdefault('User-Agent', USER_AGENT)
 
-        if payload is not None:
+        if isinstance(payload, JSONPayload):
+            for name, value in payload.headers().items():
+                headers.setdefault(name, value)
+        elif payload is not None:
             #TODO: handle case we want to put in payload json file.
             if not hasattr(payload, 'read') and not isinstance(payload, basestring):
-                payload = json.dumps(payload).encode('utf-8')
+                payload = json_dumps(payload)
                 headers.setdefault('Content-Type', 'application/json')
 
         params = encode_params(params)
         try:
-            resp = Resource.request(self, method, path=path, payload=payload, headers=headers, **params)
+            try:
+                resp = Resource.request(self, method, path=path,
+                        payload=payload, headers=headers, **params)
+            except RequestFailed, e:
+                if self.gzip is None or not self.gzip.rejects(e.response):
+                    raise
+                # the server doesn't accept compressed requests
+                resp = Resource.request(self, method, path=path,
+                        payload=payload, headers=headers, **params)
         except ResourceError, e:
             msg = getattr(e, 'msg', '')
             if e.response and msg:
                 if e.response.headers.get('content-type') == 'application/json':
                     try:
-                        msg = json.loads(msg)
+                        msg = json_loads(msg)
                     except ValueError:
                         pass
 
@@ -152,11 +271,11 @@ def encode_params(params):
     if params:
         for name, value in params.items():
             if name in ('key', 'startkey', 'endkey'):
-                value = json.dumps(value)
+                value = json_dumps(value)
             elif value is None:
                 continue
             elif not isinstance(value, basestring):
-                value = json.dumps(value)
+                value = json_dumps(value)
             _params[name] = value
     return _params
 
@@ -169,6 +288,16 @@ def escape_docid(docid):
         docid = url_quote(docid, safe='')
     return docid
 
+def has_inline_attachments(attachments):
+    """ return True if some attachments have their data inlined, False
+    if there are none or only stubs """
+    if not attachments:
+        return False
+    for v in attachments.itervalues():
+        if not v.get('stub', False):
+            return True
+    return False
+
 re_sp = re.compile('\s')
 def encode_attachments(attachments):
     for k, v in attachments.iteritems():
@@ -165,7 +165,7 @@ list_to_python, convert_property, value_to_property, LazyDict, LazyList, \
 LazySet
 from .base import ReservedWordError, ALLOWED_PROPERTY_TYPES, \
 DocumentSchema, SchemaProperties, DocumentBase, QueryMixin, \
-AttachmentMixin, Document, StaticDocument, valid_id
+AttachmentMixin, Document, StaticDocument, CompactDocument, valid_id
 from .properties_proxy import SchemaProperty, SchemaListProperty, \
 SchemaDictProperty
 
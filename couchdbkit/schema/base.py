@@ -8,6 +8,8 @@ to map CouchDB document in Python statically, dynamically or both
 """
 from __future__ import absolute_import
 
+import re
+
 from . import properties as p
 from .properties import (
     value_to_python, convert_property, MAP_TYPES_PROPERTIES,
@@ -20,7 +22,7 @@ from ..exceptions import (
 
 __all__ = ['ReservedWordError', 'ALLOWED_PROPERTY_TYPES', 'DocumentSchema',
         'SchemaProperties', 'DocumentBase', 'QueryMixin', 'AttachmentMixin',
-        'Document', 'StaticDocument', 'valid_id']
+        'Document', 'StaticDocument', 'CompactDocument', 'valid_id']
 
 _RESERVED_WORDS = ['_id', '_rev', '$schema']
 
@@ -37,6 +39,140 @@ def valid_id(value):
         return value
     raise TypeError('id "%s" is invalid' % value)
 
+# JSON values `to_json(validate(to_python(value)))` returns unchanged.
+# `wrap` keeps them as they are read from CouchDB.
+re_json_datetime = re.compile(r'^\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])'
+        r'T([01]\d|2[0-3]):[0-5]\d:[0-5]\dZ\Z')
+re_json_date = re.compile(r'^\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])\Z')
+re_json_time = re.compile(r'^([01]\d|2[0-3]):[0-5]\d:[0-5]\d\Z')
+
+# The JSON decoder returns ASCII strings as `str`, `__get__` converts them
+# to unicode.
+_WRAP_CHECKS = {
+    p.StringProperty: "isinstance(value, basestring)",
+    p.IntegerProperty: "type(value) is int or type(value) is long",
+    p.FloatProperty: "type(value) is float",
+    p.BooleanProperty: "type(value) is bool",
+    p.DateTimeProperty: "isinstance(value, basestring) and "
+            "match_datetime(value) is not None",
+    p.DateProperty: "isinstance(value, basestring) and "
+            "match_date(value) is not None",
+    p.TimeProperty: "isinstance(value, basestring) and "
+            "match_time(value) is not None",
+    p.ListProperty: "type(value) is list",
+    p.DictProperty: "type(value) is dict"
+}
+
+_WRAP_PROPERTY = """
+    prop = props[%(index)d]
+    value = data.get(%(name)r)
+    if %(check)s:
+        pass
+    elif value is None:
+        prop.__property_init__(instance, prop.default_value())
+    else:
+        prop.__property_init__(instance, prop.to_python(value))
+"""
+
+def _wrap_check(prop):
+    """ return the expression testing if the JSON value of `prop` can be
+    kept as is, or None if it must always be converted """
+    if prop.validators or prop.choices:
+        return None
+    if getattr(prop, 'auto_now', False) or \
+            getattr(prop, 'item_type', None) is not None:
+        return None
+    return _WRAP_CHECKS.get(type(prop))
+
+def _has_custom_init(cls):
+    # `__init__` of the classes of this module only sets the default
+    # values `wrap` replaces.
+    for klass in cls.__mro__:
+        if '__init__' in vars(klass):
+            return klass.__module__ != __name__
+    return False
+
+def compile_wrap(cls):
+    """ generate the `wrap` function of a schema class, or return None if
+    the class has its own `__init__`.
+
+    Values of the builtin properties already in their JSON form aren't
+    converted to python and back. Other values and properties go through
+    `to_python` and `__property_init__` like in `DocumentSchema.wrap`.
+    """
+    if _has_custom_init(cls):
+        return None
+
+    props = cls._properties.values()
+    source = ["def wrap(cls, data):",
+              "    instance = cls.__new__(cls)"]
+    if cls._compact:
+        source.append("    set_attribute(instance, '_doc', data)")
+    else:
+        source.append("    instance.__dict__.update(_dynamic_properties={}, "
+                "_doc=data)")
+    for index, prop in enumerate(props):
+        source.append(_WRAP_PROPERTY % {"index": index, "name": prop.name,
+                "check": _wrap_check(prop) or "False"})
+    if not cls._compact:
+        source.extend(["    if cls._allow_dynamic_properties:",
+                       "        wrap_dynamic_properties(instance, data, "
+                            "property_keys)"])
+    source.append("    return instance")
+
+    namespace = {
+        "props": props,
+        "set_attribute": object.__setattr__,
+        "property_keys": _property_keys(cls),
+        "match_datetime": re_json_datetime.match,
+        "match_date": re_json_date.match,
+        "match_time": re_json_time.match,
+        "wrap_dynamic_properties": _wrap_dynamic_properties
+    }
+    code = compile("\n".join(source), "<%s.wrap>" % cls.__name__, "exec")
+    exec code in namespace
+    return namespace["wrap"]
+
+def _property_keys(cls):
+    """ names and keys in the document of the properties of `cls` """
+    keys = set(cls._properties)
+    keys.update(prop.name for prop in cls._properties.itervalues())
+    return keys
+
+def _copy_json(value):
+    """ copy the lists and dicts of a JSON value """
+    if isinstance(value, dict):
+        value = value.copy()
+        for k, v in value.iteritems():
+            if isinstance(v, (dict, list)):
+                value[k] = _copy_json(v)
+    elif isinstance(value, list):
+        value = list(value)
+        for i, v in enumerate(value):
+            if isinstance(v, (dict, list)):
+                value[i] = _copy_json(v)
+    return value
+
+def _wrap_dynamic_properties(instance, data, property_keys):
+    infer_types = instance._infer_types
+    for attr_name, value in data.iteritems():
+        if attr_name in property_keys:
+            continue
+        if value is None:
+            continue
+        elif attr_name.startswith('_'):
+            continue
+        elif attr_name == 'doc_type':
+            continue
+        else:
+            if infer_types is True or \
+                    (infer_types and attr_name in infer_types):
+                value = value_to_python(value)
+            elif isinstance(value, list):
+                # LazyList empties the list in _doc before filling it
+                value = list(value)
+            setattr(instance, attr_name, value)
+
 class SchemaProperties(type):
 
     def __new__(cls, name, bases, attrs):
@@ -82,7 +218,25 @@ class SchemaProperties(type):
                 attrs[attr_name] = prop
 
         attrs['_properties'] = properties
-        return type.__new__(cls, name, bases, attrs)
+
+        compact = attrs.get('_compact')
+        if compact is None:
+            compact = any(getattr(base, '_compact', False) for base in bases)
+        if compact:
+            # values are only stored in _doc, in a slot of the instance.
+            # The __dict__ slot inherited from Document stays, but no dict
+            # is created unless an attribute is stored in it
+            attrs['_allow_dynamic_properties'] = False
+            attrs['_track_changes'] = False
+            if '__slots__' not in attrs:
+                if any(getattr(base, '_compact', False) for base in bases):
+                    attrs['__slots__'] = ()
+                else:
+                    attrs['__slots__'] = ('_doc',)
+
+        new_cls = type.__new__(cls, name, bases, attrs)
+        new_cls._compiled_wrap = staticmethod(compile_wrap(new_cls))
+        return new_cls
 
 
 class DocumentSchema(object):
@@ -90,11 +244,23 @@ class DocumentSchema(object):
 
     _dynamic_properties = None
     _allow_dynamic_properties = True
+    _lazy_wrap = False
+    _compact = False
+    # True, False or the names of the dynamic properties whose strings
+    # are converted to dates, times and decimals when wrapped
+    _infer_types = True
+    # if True, a copy of the values read from CouchDB is kept to find the
+    # changes and unchanged documents aren't saved again
+    _track_changes = False
+    _snapshot = None
     _doc = None
+    _property_cache = None
 
     def __init__(self, _d=None, **properties):
-        self._dynamic_properties = {}
-        self._doc = {}
+        if not self._compact:
+            self._dynamic_properties = {}
+        # the _doc slot of compact documents isn't set yet
+        object.__setattr__(self, '_doc', {})
 
         if _d is not None:
             if not isinstance(_d, dict):
@@ -109,7 +275,8 @@ class DocumentSchema(object):
             else:
                 value = prop.default_value()
             prop.__property_init__(self, value)
-            self.__dict__[prop.name] = value
+            if not self._compact:
+                self.__dict__[prop.name] = value
 
         _dynamic_properties = properties.copy()
         for attr_name, value in _dynamic_properties.iteritems():
@@ -172,7 +339,8 @@ class DocumentSchema(object):
             value = LazyDict(self._doc[key], init_vals=value)
         else:
             check_reserved_words(key)
-            if not hasattr( self, key ) and not self._allow_dynamic_properties:
+            if not hasattr( self, key ) and \
+                    (not self._allow_dynamic_properties or self._compact):
                 raise AttributeError("%s is not defined in schema (not a valid property)" % key)
 
             elif not key.startswith('_') and \
@@ -228,6 +396,8 @@ class DocumentSchema(object):
             return self._dynamic_properties[key]
         elif key  in ('_id', '_rev', '_attachments', 'doc_type'):
             return self._doc.get(key)
+        elif self._compact:
+            raise AttributeError(key)
         try:
             return self.__dict__[key]
         except KeyError, e:
@@ -296,12 +466,38 @@ class DocumentSchema(object):
 
     def __getstate__(self):
         """ let pickle play with us """
-        obj_dict = self.__dict__.copy()
-        return obj_dict
+        if self._compact:
+            # don't create the __dict__ of the instance
+            return {'_doc': self._doc}
+        return self.__dict__.copy()
+
+    def __setstate__(self, state):
+        if self._compact:
+            state = state.copy()
+            object.__setattr__(self, '_doc', state.pop('_doc'))
+            if not state:
+                return
+        self.__dict__.update(state)
 
     @classmethod
     def wrap(cls, data):
-        """ wrap `data` dict in object properties """
+        """ wrap `data` dict in object properties. If `_lazy_wrap` is
+        True on the class, the values are converted when they're read. """
+        if cls._lazy_wrap:
+            instance = cls._wrap_lazily(data)
+        elif cls._compiled_wrap is not None:
+            instance = cls._compiled_wrap(cls, data)
+        else:
+            instance = cls._generic_wrap(data)
+
+        if cls._track_changes:
+            # taken once the defaults are set, so a property missing from
+            # `data` isn't a change
+            instance._take_snapshot()
+        return instance
+
+    @classmethod
+    def _generic_wrap(cls, data):
         instance = cls()
         instance._doc = data
         for prop in instance._properties.values():
@@ -315,25 +511,71 @@ class DocumentSchema(object):
                 value = prop.default_value()
             prop.__property_init__(instance, value)
 
-        if cls._allow_dynamic_properties:
-            for attr_name, value in data.iteritems():
-                if attr_name in instance.properties():
-                    continue
-                if value is None:
-                    continue
-                elif attr_name.startswith('_'):
-                    continue
-                elif attr_name == 'doc_type':
-                    continue
-                else:
-                    value = value_to_python(value)
-                    setattr(instance, attr_name, value)
+        if cls._allow_dynamic_properties and not cls._compact:
+            _wrap_dynamic_properties(instance, data, _property_keys(cls))
+        return instance
+
+    @classmethod
+    def _wrap_lazily(cls, data):
+        """ wrap `data` without converting the values of the properties.
+        A value is converted the first time the property is read. """
+        if cls._compiled_wrap is None:
+            instance = cls()
+            instance._doc = data
+        else:
+            # the class has no __init__ of its own
+            instance = cls.__new__(cls)
+            if cls._compact:
+                object.__setattr__(instance, '_doc', data)
+            else:
+                instance.__dict__.update(_dynamic_properties={}, _doc=data)
+        if not cls._compact:
+            # compact documents don't keep the converted values
+            instance.__dict__['_property_cache'] = {}
+        for prop in cls._properties.itervalues():
+            if data.get(prop.name) is None:
+                prop.__property_init__(instance, prop.default_value())
+
+        if cls._allow_dynamic_properties and not cls._compact:
+            _wrap_dynamic_properties(instance, data, _property_keys(cls))
         return instance
     from_json = wrap
 
+    def get_changes(self):
+        """ get the values changed since the document was read from
+        CouchDB or saved.
+
+        @return: dict, the JSON values `(old, new)` of each key changed in
+        the document, None if the key wasn't or isn't there. All the values
+        are returned if the changes aren't tracked.
+        """
+        snapshot = self._snapshot or {}
+        changes = {}
+        for key, value in self._doc.iteritems():
+            if key not in snapshot:
+                changes[key] = (None, value)
+            else:
+                old = snapshot[key]
+                if old != value or type(old) is not type(value):
+                    changes[key] = (old, value)
+        for key, old in snapshot.iteritems():
+            if key not in self._doc:
+                changes[key] = (old, None)
+        return changes
+
+    def _take_snapshot(self):
+        if self._track_changes:
+            self.__dict__['_snapshot'] = _copy_json(self._doc)
+
     def validate(self, required=True):
-        """ validate a document """
+        """ validate a document. If the changes are tracked, only the
+        properties changed since the document was read are validated. """
+        changes = None
+        if self._snapshot is not None:
+            changes = self.get_changes()
         for attr_name, value in self._doc.items():
+            if changes is not None and attr_name not in changes:
+                continue
             if attr_name in self._properties:
                 self._properties[attr_name].validate(
                         getattr(self, attr_name), required=required)
@@ -341,7 +583,7 @@ class DocumentSchema(object):
 
     def clone(self, **kwargs):
         """ clone a document """
-        kwargs.update(self._dynamic_properties)
+        kwargs.update(self._dynamic_properties or {})
         obj = self.__class__(**kwargs)
         obj._doc = self._doc
         return obj
@@ -425,11 +667,24 @@ class DocumentBase(DocumentSchema):
             self._doc['doc_type'] = doc_type
         return self._doc
 
-    def save(self, **params):
-        """ Save document in database.
+    def is_unchanged(self):
+        """ return True if the document was read from CouchDB or saved
+        and hasn't changed since """
+        return self._snapshot is not None and not self.new_document and \
+                not self.get_changes()
+
+    def save(self, force=False, **params):
+        """ Save document in database. If `_track_changes` is True on the
+        class, nothing is sent if the document hasn't changed since it was
+        read or saved.
 
         @params db: couchdbkit.core.Database instance
+        @param force: boolean, if True the document is saved even if it
+        hasn't changed.
         """
+        if not force and self.is_unchanged():
+            return
+
         self.validate()
         db = self._db
 
@@ -439,11 +694,13 @@ class DocumentBase(DocumentSchema):
             self._doc.update(doc)
         elif '_id' in doc:
             self._doc.update({'_id': doc['_id']})
+        self._take_snapshot()
 
     store = save
 
     @classmethod
-    def save_docs(cls, docs, use_uuids=True, all_or_nothing=False):
+    def save_docs(cls, docs, use_uuids=True, all_or_nothing=False,
+            force=False):
         """ Save multiple documents in database.
 
         @params docs: list of couchdbkit.schema.Document instance
@@ -452,13 +709,29 @@ class DocumentBase(DocumentSchema):
         restarts either all the changes will have been saved or none of them.
         However, it does not do conflict checking, so the documents will
         be committed even if this creates conflicts.
+        @param force: boolean, if False the documents that haven't
+        changed since they were read or saved aren't sent.
 
         """
         db = cls.get_db()
         docs_to_save = [doc for doc in docs if doc._doc_type == cls._doc_type]
         if not len(docs_to_save) == len(docs):
             raise ValueError("one of your documents does not have the correct type")
-        db.bulk_save(docs_to_save, use_uuids=use_uuids, all_or_nothing=all_or_nothing)
+        if not force:
+            docs_to_save = [doc for doc in docs_to_save
+                    if not doc.is_unchanged()]
+            if not docs_to_save:
+                return
+
+        revs = [doc._doc.get('_rev') for doc in docs_to_save]
+        try:
+            db.bulk_save(docs_to_save, use_uuids=use_uuids,
+                    all_or_nothing=all_or_nothing)
+        finally:
+            # the documents saved got a new revision
+            for doc, rev in zip(docs_to_save, revs):
+                if doc._doc.get('_rev') != rev:
+                    doc._take_snapshot()
 
     bulk_save = save_docs
 
@@ -471,6 +744,16 @@ class DocumentBase(DocumentSchema):
         cls._allow_dynamic_properties = dynamic_properties
         return db.get(docid, rev=rev, wrapper=cls.wrap)
 
+    @classmethod
+    def get_many(cls, ids, db=None, dynamic_properties=True, **params):
+        """ get documents with `ids`. Missing or deleted documents are None.
+        See `Database.open_docs` for the options.
+        """
+        if not db:
+            db = cls.get_db()
+        cls._allow_dynamic_properties = dynamic_properties
+        return db.open_docs(ids, wrapper=cls.wrap, **params)
+
     @classmethod
     def get_or_create(cls, docid=None, db=None, dynamic_properties=True, **params):
         """ get  or create document with `docid` """
@@ -673,3 +956,15 @@ class StaticDocument(Document):
     Shorthand for a document that disallow dynamic properties.
     """
     _allow_dynamic_properties = False
+
+class CompactDocument(StaticDocument):
+    """
+    Document storing its values only in `_doc`, kept in a slot of the
+    instance. Dynamic properties are disallowed and the values converted
+    from JSON aren't kept, which makes instances much smaller when a
+    lot of documents are held in memory.
+
+    Instances still have the `__dict__` slot of `Document`, the dict is
+    only created if an attribute is set directly in it.
+    """
+    _compact = True
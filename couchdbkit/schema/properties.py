@@ -56,6 +56,22 @@ re_time = re.compile('^([01]\d|2[0-3])\D?([0-5]\d)\D?([0-5]\d)?\D?(\d{3})?$')
 re_datetime = re.compile('^(\d{4})\D?(0[1-9]|1[0-2])\D?([12]\d|0[1-9]|3[01])(\D?([01]\d|2[0-3])\D?([0-5]\d)\D?([0-5]\d)?\D?(\d{3})?([zZ]|([\+-])([01]\d|2[0-3])\D?([0-5]\d)?)?)?$')
 re_decimal = re.compile('^(\d+)\.(\d+)$')
 
+# canonical ISO 8601 forms, parsed without strptime
+re_iso_datetime = re.compile(r'(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)\Z')
+re_iso_date = re.compile(r'(\d{4})-(\d\d)-(\d\d)\Z')
+re_iso_time = re.compile(r'(\d\d):(\d\d):(\d\d)\Z')
+
+# strings `value_to_python` converts: the values matched by re_date,
+# re_time, re_datetime and re_decimal that the properties can convert
+re_python_value = re.compile(r"""
+    (?:(?P<year>\d{4})-(?P<month>0[1-9]|1[0-2])-(?P<day>[12]\d|0[1-9]|3[01])
+       (?:T(?P<hour>[01]\d|2[0-3]):(?P<minute>[0-5]\d):(?P<second>[0-5]\d)
+          \D?(?:\d{3})?(?:[zZ]|[\+-](?:[01]\d|2[0-3])\D?(?:[0-5]\d)?)?)?
+     | (?P<thour>[01]\d|2[0-3]):(?P<tminute>[0-5]\d):(?P<tsecond>[0-5]\d)
+       (?:\.(?:\d{3})?\n?)?
+     | (?P<decimal>\d+\.\d+\n?)
+    )\Z""", re.VERBOSE)
+
 class Property(object):
     """ Property base which all other properties
     inherit."""
@@ -100,14 +116,27 @@ class Property(object):
             return self
 
         value = document_instance._doc.get(self.name)
-        if value is not None:
-            value = self._to_python(value)
+        if value is None:
+            return value
 
-        return value
+        cache = document_instance._property_cache
+        if cache is None:
+            return self._to_python(value)
+
+        # documents wrapped lazily keep the value converted from the JSON
+        # value until it's replaced in _doc
+        cached = cache.get(self.name)
+        if cached is not None and cached[0] is value:
+            return cached[1]
+        python_value = self._to_python(value)
+        cache[self.name] = (value, python_value)
+        return python_value
 
     def __set__(self, document_instance, value):
         value = self.validate(value, required=False)
         document_instance._doc[self.name] = self._to_json(value)
+        if document_instance._property_cache:
+            document_instance._property_cache.pop(self.name, None)
 
     def __delete__(self, document_instance):
         pass
@@ -317,7 +346,7 @@ class DateTimeProperty(Property):
             try:
                 value = value.split('.', 1)[0] # strip out microseconds
                 value = value[0:19] # remove timezone
-                value = datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S')
+                value = parse_datetime(value)
             except ValueError, e:
                 raise ValueError('Invalid ISO date/time %r [%s]' %
                         (value, str(e)))
@@ -352,7 +381,7 @@ class DateProperty(DateTimeProperty):
     def to_python(self, value):
         if isinstance(value, basestring):
             try:
-                value = datetime.date(*time.strptime(value, '%Y-%m-%d')[:3])
+                value = parse_date(value)
             except ValueError, e:
                 raise ValueError('Invalid ISO date %r [%s]' % (value,
                     str(e)))
@@ -380,7 +409,7 @@ class TimeProperty(DateTimeProperty):
         if isinstance(value, basestring):
             try:
                 value = value.split('.', 1)[0] # strip out microseconds
-                value = datetime.time(*time.strptime(value, '%H:%M:%S')[3:6])
+                value = parse_time(value)
             except ValueError, e:
                 raise ValueError('Invalid ISO time %r [%s]' % (value,
                     str(e)))
@@ -941,10 +970,14 @@ MAP_TYPES_PROPERTIES = {
         set: SetProperty,
 }
 
+# property instances converting the values of each type
+_CONVERTERS = dict((data_type, prop_class()) for data_type, prop_class
+        in MAP_TYPES_PROPERTIES.items())
+
 def convert_property(value):
     """ convert a value to json from Property._to_json """
-    if type(value) in MAP_TYPES_PROPERTIES:
-        prop = MAP_TYPES_PROPERTIES[type(value)]()
+    prop = _CONVERTERS.get(type(value))
+    if prop is not None:
         value = prop.to_json(value)
     return value
 
@@ -1022,29 +1055,84 @@ def value_to_python(value, item_type=None):
     """ convert a json value to python type using regexp. values converted
     have been put in json via `value_to_json` .
     """
-    data_type = None
     if isinstance(value, basestring):
-        if re_date.match(value) and is_type_ok(item_type, datetime.date):
-            data_type = datetime.date
-        elif re_time.match(value) and is_type_ok(item_type, datetime.time):
-            data_type = datetime.time
-        elif re_datetime.match(value) and is_type_ok(item_type, datetime.datetime):
-            data_type = datetime.datetime
-        elif re_decimal.match(value) and is_type_ok(item_type, decimal.Decimal):
-            data_type = decimal.Decimal
-        if data_type is not None:
-            prop = MAP_TYPES_PROPERTIES[data_type]()
-            try:
-                #sometimes regex fail so return value
-                value = prop.to_python(value)
-            except:
-                pass
+        value = string_to_python(value, item_type=item_type)
     elif isinstance(value, (list, MutableSet)):
         value = list_to_python(value, item_type=item_type)
     elif isinstance(value, dict):
         value = dict_to_python(value, item_type=item_type)
     return value
 
+def string_to_python(value, item_type=None):
+    """ convert a json string to a date, time, datetime or decimal if it
+    looks like one, else return it unchanged """
+    # all the converted strings start with a digit
+    if not value or not '0' <= value[0] <= '9':
+        return value
+    match = re_python_value.match(value)
+    if match is None:
+        return value
+
+    try:
+        if match.group('year') is not None:
+            year, month, day, hour, minute, second = match.group('year',
+                    'month', 'day', 'hour', 'minute', 'second')
+            if hour is None:
+                if is_type_ok(item_type, datetime.date):
+                    return datetime.date(int(year), int(month), int(day))
+            elif is_type_ok(item_type, datetime.datetime):
+                return datetime.datetime(int(year), int(month), int(day),
+                        int(hour), int(minute), int(second))
+        elif match.group('thour') is not None:
+            if is_type_ok(item_type, datetime.time):
+                hour, minute, second = match.group('thour', 'tminute',
+                        'tsecond')
+                return datetime.time(int(hour), int(minute), int(second))
+        elif is_type_ok(item_type, decimal.Decimal) and \
+                not _taken_for_date(value, item_type):
+            return decimal.Decimal(value)
+    except ValueError:
+        pass
+    return value
+
+def _taken_for_date(value, item_type):
+    # some decimals, like "12.30", are taken for a date or a time that
+    # can't be parsed and are kept as strings
+    return (re_date.match(value) and is_type_ok(item_type, datetime.date)) \
+        or (re_time.match(value) and is_type_ok(item_type, datetime.time)) \
+        or (re_datetime.match(value) and
+                is_type_ok(item_type, datetime.datetime))
+
+def parse_datetime(value):
+    """ parse a datetime in the '%Y-%m-%dT%H:%M:%S' format """
+    match = re_iso_datetime.match(value)
+    if match is not None:
+        try:
+            return datetime.datetime(*[int(v) for v in match.groups()])
+        except ValueError:
+            pass
+    return datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S')
+
+def parse_date(value):
+    """ parse a date in the '%Y-%m-%d' format """
+    match = re_iso_date.match(value)
+    if match is not None:
+        try:
+            return datetime.date(*[int(v) for v in match.groups()])
+        except ValueError:
+            pass
+    return datetime.date(*time.strptime(value, '%Y-%m-%d')[:3])
+
+def parse_time(value):
+    """ parse a time in the '%H:%M:%S' format """
+    match = re_iso_time.match(value)
+    if match is not None:
+        try:
+            return datetime.time(*[int(v) for v in match.groups()])
+        except ValueError:
+            pass
+    return datetime.time(*time.strptime(value, '%H:%M:%S')[3:6])
+
 def list_to_python(value, item_type=None):
     """ convert a list of json values to python list """
     return [value_to_python(item, item_type=item_type) for item in value]
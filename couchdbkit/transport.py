@@ -0,0 +1,480 @@
+# -*- coding: utf-8 -
+#
+# This file is part of couchdbkit released under the MIT license.
+# See the NOTICE for more information.
+
+"""
+HTTP transports used by `CouchdbResource` instead of the restkit client::
+
+    from couchdbkit import Server
+    from couchdbkit.transport import HTTPTransport, UnixSocketTransport
+
+    s = Server(transport=HTTPTransport(pool_size=20))
+
+    # local CouchDB listening on a unix socket
+    s = Server("http://localhost", transport=UnixSocketTransport(
+        "/var/run/couchdb/couchdb.sock"))
+
+A transport has a `request(url, method, body, headers, filters)` method
+returning a response with the interface of the restkit response used by
+couchdbkit: `status_int`, case insensitive `headers`, `body_string()`,
+`body_stream()`, `close()` and `json_body`.
+
+Available transports:
+
+- `RestkitTransport`: the restkit client, used when no transport is set.
+- `HTTPTransport`: httplib connections kept alive in a pool.
+- `UnixSocketTransport`: httplib connections to a unix socket.
+- `Urllib3Transport`: a urllib3 pool manager. Requires urllib3.
+
+Run `examples/transport_benchmark.py` to compare their overhead.
+"""
+
+from __future__ import with_statement
+
+import errno
+import httplib
+import socket
+from StringIO import StringIO
+import threading
+import types
+
+from restkit.client import Client
+from restkit.errors import RequestError, RequestTimeout
+from restkit.util import to_bytestring
+from restkit.wrappers import Request
+
+from .hedge import check_aborted, is_aborted, track_connection
+from .resource import JSONResponse
+
+try:
+    import urllib3
+except ImportError:
+    urllib3 = None
+
+__all__ = ['get_transport', 'RestkitTransport', 'HTTPTransport',
+        'UnixSocketTransport', 'Urllib3Transport']
+
+DEFAULT_POOL_SIZE = 10
+CHUNK_SIZE = 16 * 1024
+
+# errors meaning a kept alive connection has been closed by the server
+STALE_ERRORS = (errno.EPIPE, errno.ECONNRESET, errno.ECONNABORTED)
+
+
+class TransportClient(object):
+    """ client of a `CouchdbResource` sending its requests with a
+    transport and the filters of the resource """
+
+    def __init__(self, transport, filters=None):
+        self.transport = get_transport(transport)
+        self.filters = filters or []
+
+    def request(self, url, method='GET', body=None, headers=None):
+        return self.transport.request(url, method=method, body=body,
+                headers=headers, filters=self.filters)
+
+
+def get_transport(transport):
+    """ return a transport instance from a name ("restkit", "http",
+    "urllib3") or an instance """
+    if not isinstance(transport, basestring):
+        return transport
+    try:
+        return TRANSPORTS[transport]()
+    except KeyError:
+        raise ValueError("unknown transport %r" % transport)
+
+
+class Headers(dict):
+    """ case insensitive dict of response headers """
+
+    def __init__(self, items=()):
+        dict.__init__(self, ((k.lower(), v) for k, v in items))
+
+    def __getitem__(self, key):
+        return dict.__getitem__(self, key.lower())
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key.lower())
+
+    def get(self, key, default=None):
+        return dict.get(self, key.lower(), default)
+
+    def iget(self, key, default=None):
+        return dict.get(self, key.lower(), default)
+
+
+class ResponseBody(object):
+    """ buffered file object reading a response """
+
+    def __init__(self, read):
+        self._read = read
+        self._buf = ""
+        self._eof = False
+
+    def _fill(self, size=CHUNK_SIZE):
+        if self._eof:
+            return False
+        data = self._read(size)
+        if not data:
+            self._eof = True
+            return False
+        self._buf += data
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            while self._fill():
+                pass
+            data, self._buf = self._buf, ""
+            return data
+
+        while len(self._buf) < size and self._fill(max(size, CHUNK_SIZE)):
+            pass
+        data, self._buf = self._buf[:size], self._buf[size:]
+        return data
+
+    def readline(self, limit=-1):
+        while True:
+            idx = self._buf.find("\n")
+            if idx >= 0:
+                end = idx + 1
+                break
+            if limit >= 0 and len(self._buf) >= limit:
+                end = limit
+                break
+            if not self._fill():
+                end = len(self._buf)
+                break
+        if limit >= 0:
+            end = min(end, limit)
+        line, self._buf = self._buf[:end], self._buf[end:]
+        return line
+
+    def readlines(self, hint=None):
+        return list(self)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+
+class TransportResponse(JSONResponse):
+    """ response of a transport, with the interface of
+    `couchdbkit.resource.JSONResponse` """
+
+    def __init__(self, connection, request, status_int, reason, headers,
+            read, should_close, version=(1, 1)):
+        self.request = request
+        self.connection = connection
+
+        self.headers = Headers(headers)
+        self.status = "%s %s" % (status_int, reason)
+        self.status_int = status_int
+        self.version = version
+        self.headerslist = self.headers.items()
+        self.location = self.headers.get('location')
+        self.final_url = request.url
+        self.should_close = should_close
+
+        self._closed = False
+        self._already_read = False
+
+        if request.method == "HEAD":
+            # no body on HEAD, release the connection now
+            read(0)
+            self.connection.release(should_close)
+            self._body = StringIO("")
+        else:
+            self._body = ResponseBody(read)
+
+
+class RestkitTransport(object):
+    """ the restkit client, with its own options """
+
+    def __init__(self, **client_opts):
+        # compressed responses are decompressed by the gzip filter of
+        # the resource
+        client_opts.setdefault('decompress', False)
+        self.client_opts = client_opts
+        self._clients = {}
+
+    def request(self, url, method='GET', body=None, headers=None,
+            filters=None):
+        key = tuple(id(f) for f in filters or ())
+        client = self._clients.get(key)
+        if client is None:
+            client = Client(filters=filters, response_class=JSONResponse,
+                    **self.client_opts)
+            self._clients[key] = client
+        return client.request(url, method=method, body=body, headers=headers)
+
+
+def _filter_response(response, filters):
+    for f in filters or ():
+        if hasattr(f, 'on_response'):
+            f.on_response(response, response.request)
+    return response
+
+
+class _PooledConnection(object):
+    """ handle releasing a connection to its pool """
+
+    def __init__(self, transport, key, conn, resp):
+        self.transport = transport
+        self.key = key
+        self.conn = conn
+        self.resp = resp
+        self._released = False
+
+    def release(self, should_close=False):
+        if self._released:
+            return
+        self._released = True
+        if should_close or not self.resp.isclosed():
+            # the connection can't be reused before the response is read
+            self.conn.close()
+        else:
+            self.transport._put(self.key, self.conn)
+
+
+class HTTPConnection(httplib.HTTPConnection):
+    """ httplib connection with Nagle's algorithm disabled """
+
+    def connect(self):
+        httplib.HTTPConnection.connect(self)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class HTTPSConnection(httplib.HTTPSConnection):
+
+    def connect(self):
+        httplib.HTTPSConnection.connect(self)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class UnixHTTPConnection(httplib.HTTPConnection):
+    """ httplib connection to a unix socket """
+
+    def __init__(self, path, host="localhost", timeout=None):
+        httplib.HTTPConnection.__init__(self, host, timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        self.sock = sock
+
+
+class HTTPTransport(object):
+    """ httplib connections kept alive in a pool, per host """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=None):
+        """ Constructor for HTTPTransport
+
+        @param pool_size: int, max number of idle connections kept per host
+        @param timeout: float, socket timeout
+        """
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    def request(self, url, method='GET', body=None, headers=None,
+            filters=None):
+        request = Request(url, method=method, body=body, headers=headers)
+        for f in filters or ():
+            f.on_request(request)
+
+        u = request.parsed_url
+        key = (u.scheme, u.hostname, u.port)
+        while True:
+            check_aborted()
+            conn, reused = self._get(key)
+            try:
+                self._send(conn, request)
+                # the socket exists once the request is sent
+                track_connection(conn)
+                # buffered, httplib reads the status and headers one byte
+                # at a time otherwise
+                resp = conn.getresponse(buffering=True)
+            except socket.timeout, e:
+                conn.close()
+                raise RequestTimeout(str(e))
+            except (httplib.HTTPException, socket.error), e:
+                conn.close()
+                if reused and self._can_retry(request, e):
+                    # the server closed the idle connection, try again
+                    # with a new one
+                    continue
+                raise RequestError("%s: %s" % (e.__class__.__name__, e))
+            break
+
+        connection = _PooledConnection(self, key, conn, resp)
+        return _filter_response(TransportResponse(connection, request,
+                resp.status, resp.reason, resp.getheaders(), resp.read,
+                resp.will_close, (resp.version // 10, resp.version % 10)),
+                filters)
+
+    def close(self):
+        """ close the idle connections """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def _new_connection(self, key):
+        scheme, host, port = key
+        if scheme == "https":
+            return HTTPSConnection(host, port, timeout=self.timeout)
+        return HTTPConnection(host, port, timeout=self.timeout)
+
+    def _get(self, key):
+        with self._lock:
+            conns = self._idle.get(key)
+            if conns:
+                return conns.pop(), True
+        return self._new_connection(key), False
+
+    def _put(self, key, conn):
+        if is_aborted(conn):
+            conn.close()
+            return
+        with self._lock:
+            conns = self._idle.setdefault(key, [])
+            if len(conns) < self.pool_size:
+                conns.append(conn)
+                return
+        conn.close()
+
+    def _can_retry(self, request, error):
+        if isinstance(error, socket.error):
+            if error.errno not in STALE_ERRORS:
+                return False
+        elif not isinstance(error, httplib.BadStatusLine):
+            return False
+        body = request.body
+        return body is None or isinstance(body, types.StringTypes) or \
+                hasattr(body, 'seek')
+
+    def _send(self, conn, request):
+        headers = request.headers
+        conn.putrequest(request.method, request.path,
+                skip_host=headers.iget('host') is not None,
+                skip_accept_encoding=headers.iget('accept-encoding')
+                    is not None)
+        for k, v in headers.items():
+            conn.putheader(k, str(v))
+
+        body = request.body
+        if body is None or isinstance(body, types.StringTypes):
+            conn.endheaders(body and to_bytestring(body))
+            return
+
+        conn.endheaders()
+        chunked = request.is_chunked()
+        if hasattr(body, 'read'):
+            if hasattr(body, 'seek'):
+                body.seek(0)
+            chunks = iter(lambda: body.read(CHUNK_SIZE), '')
+        else:
+            chunks = body
+
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if chunked:
+                conn.send("%X\r\n%s\r\n" % (len(chunk), chunk))
+            else:
+                conn.send(chunk)
+        if chunked:
+            conn.send("0\r\n\r\n")
+
+
+class UnixSocketTransport(HTTPTransport):
+    """ httplib connections to a unix socket. The host of the urls is
+    only used in the Host header. """
+
+    def __init__(self, path, pool_size=DEFAULT_POOL_SIZE, timeout=None):
+        """ Constructor for UnixSocketTransport
+
+        @param path: str, path of the unix socket
+        """
+        HTTPTransport.__init__(self, pool_size=pool_size, timeout=timeout)
+        self.path = path
+
+    def _new_connection(self, key):
+        return UnixHTTPConnection(self.path, host=key[1] or "localhost",
+                timeout=self.timeout)
+
+
+class _Urllib3Connection(object):
+
+    def __init__(self, resp):
+        self.resp = resp
+
+    def release(self, should_close=False):
+        if should_close:
+            self.resp.close()
+        self.resp.release_conn()
+
+
+class Urllib3Transport(object):
+    """ urllib3 pool manager """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=None,
+            **pool_opts):
+        """ Constructor for Urllib3Transport
+
+        @param pool_size: int, max number of connections kept per host
+        @param timeout: float, socket timeout
+        @param pool_opts: other options of `urllib3.PoolManager`
+        """
+        if urllib3 is None:
+            raise ImportError("Urllib3Transport requires urllib3")
+        if timeout is not None:
+            pool_opts['timeout'] = timeout
+        self.manager = urllib3.PoolManager(maxsize=pool_size, **pool_opts)
+
+    def request(self, url, method='GET', body=None, headers=None,
+            filters=None):
+        request = Request(url, method=method, body=body, headers=headers)
+        for f in filters or ():
+            f.on_request(request)
+
+        body = request.body
+        if body is not None and not isinstance(body, types.StringTypes) \
+                and hasattr(body, 'read'):
+            fp = body
+            if request.is_chunked():
+                body = iter(lambda: fp.read(CHUNK_SIZE), '')
+            else:
+                body = fp.read()
+
+        resp = self.manager.urlopen(method, url, body=body,
+                headers=dict(request.headers.items()),
+                chunked=request.is_chunked(), redirect=False,
+                retries=False, preload_content=False, decode_content=False)
+        return _filter_response(TransportResponse(_Urllib3Connection(resp),
+                request, resp.status, resp.reason,
+                resp.getheaders().items(), resp.read, False,
+                (resp.version // 10, resp.version % 10)), filters)
+
+    def close(self):
+        self.manager.clear()
+
+
+TRANSPORTS = {
+    "restkit": RestkitTransport,
+    "http": HTTPTransport,
+    "urllib3": Urllib3Transport
+}
@@ -31,7 +31,199 @@ Install it with the command:
 
     pip install simplejson
 """)
- 
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def json_default(obj):
+    """ convert the objects the json codecs don't know, the same way the
+    schema does: dates in ISO 8601, decimals and sets. Documents are
+    converted with their `to_json` method. """
+    if hasattr(obj, 'to_json'):
+        return obj.to_json()
+    from .schema.properties import value_to_json
+    value = value_to_json(obj)
+    if value is obj:
+        raise TypeError("%r is not JSON serializable" % obj)
+    return value
+
+
+class JSONCodec(object):
+    """ json codec based on the json module or simplejson. `dumps`
+    returns a bytestring and `loads` accepts bytestrings, the utf-8 is
+    decoded while parsing. """
+
+    name = "json"
+
+    def __init__(self, module=json, name=None):
+        self.module = module
+        if name is not None:
+            self.name = name
+        self._encoder = module.JSONEncoder(separators=(',', ':'),
+                default=json_default)
+        self._decoder = module.JSONDecoder()
+
+    def dumps(self, obj):
+        # ensure_ascii is on, the result is already a bytestring
+        return to_bytestring(self._encoder.encode(obj))
+
+    def loads(self, data):
+        return self._decoder.decode(data)
+
+    def load(self, fp):
+        return self.loads(fp.read())
+
+
+class UJSONCodec(JSONCodec):
+    """ ujson codec, using the json module for the values ujson can't
+    handle. Old ujson versions without the `default` argument are only
+    used to decode, they would encode dates as timestamps. """
+
+    name = "ujson"
+
+    def __init__(self):
+        JSONCodec.__init__(self)
+        try:
+            ujson.dumps(None, default=json_default)
+        except TypeError:
+            self.dumps = super(UJSONCodec, self).dumps
+
+    def dumps(self, obj):
+        try:
+            return to_bytestring(ujson.dumps(obj, ensure_ascii=False,
+                escape_forward_slashes=False, default=json_default))
+        except OverflowError:
+            # integers larger than 64 bits
+            return JSONCodec.dumps(self, obj)
+
+    def loads(self, data):
+        try:
+            return ujson.loads(data, precise_float=True)
+        except (ValueError, OverflowError):
+            # large numbers, or an invalid document the json module
+            # reports better
+            return JSONCodec.loads(self, data)
+
+
+def _stdlib_json_codec():
+    import json as stdlib_json
+    return JSONCodec(stdlib_json)
+
+
+# codecs by order of preference
+JSON_CODECS = [
+    ("ujson", ujson and UJSONCodec),
+    ("simplejson", json.__name__ == "simplejson" and
+        (lambda: JSONCodec(json, name="simplejson"))),
+    ("json", _stdlib_json_codec)
+]
+
+_json_codec = None
+
+
+def register_json_codec(name, codec_class, preferred=False):
+    """ register a json codec
+
+    :attr name: string, name of the codec
+    :attr codec_class: callable returning an object with `dumps`,
+    `loads` and `load` methods, like `JSONCodec`
+    :attr preferred: boolean, if True the codec becomes the first choice
+    """
+    global JSON_CODECS
+    codecs_ = [(n, c) for n, c in JSON_CODECS if n != name]
+    if preferred:
+        codecs_.insert(0, (name, codec_class))
+    else:
+        codecs_.insert(len(codecs_) - 1, (name, codec_class))
+    JSON_CODECS = codecs_
+    if preferred:
+        set_json_codec(name)
+
+
+def set_json_codec(codec=None):
+    """ select the json codec used by couchdbkit
+
+    :attr codec: string, name of a registered codec, or a codec
+    instance. By default the first available codec of `JSON_CODECS`.
+
+    :return: the codec
+    """
+    global _json_codec
+    if codec is None:
+        for name, codec_class in JSON_CODECS:
+            if codec_class:
+                codec = codec_class()
+                break
+    elif isinstance(codec, basestring):
+        codec_class = dict(JSON_CODECS).get(codec)
+        if not codec_class:
+            raise ValueError("json codec %r isn't available" % codec)
+        codec = codec_class()
+    _json_codec = codec
+    return codec
+
+
+def get_json_codec():
+    """ return the json codec used by couchdbkit """
+    return _json_codec
+
+
+def json_dumps(obj):
+    """ encode `obj` to a json bytestring with the current codec """
+    return _json_codec.dumps(obj)
+
+
+def json_loads(data):
+    """ decode a json bytestring or unicode string with the current
+    codec """
+    return _json_codec.loads(data)
+
+
+def json_load(fp):
+    """ decode the json read from a file object with the current codec """
+    return _json_codec.load(fp)
+
+
+def json_iterencode(obj):
+    """ encode `obj` to json bytestrings yielded one after the other. The
+    items of the lists found in `obj` or its members are encoded one by
+    one, so a large list of documents is never encoded at once. """
+    if isinstance(obj, dict):
+        yield '{'
+        first = True
+        for key, value in obj.iteritems():
+            if first:
+                first = False
+                yield json_dumps(key) + ':'
+            else:
+                yield ',' + json_dumps(key) + ':'
+            if isinstance(value, (list, tuple)):
+                for piece in _iterencode_list(value):
+                    yield piece
+            else:
+                yield json_dumps(value)
+        yield '}'
+    elif isinstance(obj, (list, tuple)):
+        for piece in _iterencode_list(obj):
+            yield piece
+    else:
+        yield json_dumps(obj)
+
+
+def _iterencode_list(items):
+    yield '['
+    first = True
+    for item in items:
+        if first:
+            first = False
+            yield json_dumps(item)
+        else:
+            yield ',' + json_dumps(item)
+    yield ']'
+
 
 # backport relpath from python2.6
 if not hasattr(os.path, 'relpath'):
@@ -130,7 +322,7 @@ def to_bytestring(s):
         return s.encode('utf-8')
     else:
         return s
-    
+
 def read_file(fname, utf8=True, force_read=False):
     """ read file content"""
     if utf8:
@@ -176,7 +368,7 @@ def write_json(filename, content):
     :attr content: string
     
     """
-    write_content(filename, json.dumps(content))
+    write_content(filename, json_dumps(content))
 
 def read_json(filename, use_environment=False):
     """ read a json file and deserialize
@@ -199,10 +391,11 @@ def read_json(filename, use_environment=False):
         data = string.Template(data).substitute(os.environ)
 
     try:
-        data = json.loads(data)
+        data = json_loads(data)
     except ValueError:
         print >>sys.stderr, "Json is invalid, can't load %s" % filename
         raise
     return data
 
 
+set_json_codec()
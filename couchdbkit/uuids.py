@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -
+#
+# This file is part of couchdbkit released under the MIT license.
+# See the NOTICE for more information.
+
+"""
+Local uuid generators. They can be used by a `Server` instead of
+requesting uuids from CouchDB::
+
+    from couchdbkit import Server
+
+    s = Server(uuid_generator="sequential")
+"""
+
+from __future__ import with_statement
+
+import os
+import random
+import threading
+import uuid
+
+__all__ = ['random_uuid', 'SequentialUUID', 'UUID_GENERATORS',
+        'get_uuid_generator']
+
+
+def random_uuid():
+    """ return 128 random bits as an hex string, like the CouchDB
+    "random" algorithm """
+    return uuid.uuid4().hex
+
+
+class SequentialUUID(object):
+    """ CouchDB "sequential" algorithm. Uuids share a 26 hex chars random
+    prefix followed by a 6 hex chars suffix increased by a random step. A
+    new prefix is drawn when the suffix overflows. Consecutive uuids are
+    close to each other, which keeps inserts in the database B-tree
+    local. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._new_prefix()
+
+    def _new_prefix(self):
+        self.prefix = os.urandom(13).encode('hex')
+        self.sequence = random.randint(1, 0xffe)
+
+    def __call__(self):
+        with self._lock:
+            self.sequence += random.randint(1, 0xffe)
+            if self.sequence >= 0xfff000:
+                self._new_prefix()
+            return "%s%06x" % (self.prefix, self.sequence)
+
+
+UUID_GENERATORS = {
+    "random": lambda: random_uuid,
+    "sequential": SequentialUUID
+}
+
+
+def get_uuid_generator(generator):
+    """ return a uuid generator from its name or the callable itself """
+    if generator is None or callable(generator):
+        return generator
+    try:
+        return UUID_GENERATORS[generator]()
+    except KeyError:
+        raise ValueError("unknown uuid generator: %s" % generator)
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -
+#
+# This file is part of couchdbkit released under the MIT license.
+# See the NOTICE for more information.
+
+"""
+Helpers used to run requests concurrently. Requests are executed in
+threads sharing the connection pool of the resource. When the process is
+monkey patched by gevent or eventlet, those threads are green threads.
+"""
+
+from __future__ import with_statement
+
+import logging
+from Queue import Queue, Empty, Full
+import sys
+import threading
+
+from .cache import copy_json
+from .exceptions import ResultTimeout
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_MAX_PENDING = 1000
+
+logger = logging.getLogger(__name__)
+
+
+class Future(object):
+    """ result of an operation executed in another thread """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def done(self):
+        """ return True if the operation is finished """
+        return self._event.isSet()
+
+    def result(self, timeout=None):
+        """ wait for the result of the operation and return it. If the
+        operation failed its exception is raised.
+
+        @param timeout: float, max number of seconds to wait. Raise
+        `ResultTimeout` if the operation isn't finished in time.
+        """
+        self._wait(timeout)
+        if self._exc_info is not None:
+            exc_type, exc_value, tb = self._exc_info
+            raise exc_type, exc_value, tb
+        return self._result
+
+    def exception(self, timeout=None):
+        """ wait for the operation and return its exception or None """
+        self._wait(timeout)
+        if self._exc_info is not None:
+            return self._exc_info[1]
+        return None
+
+    def add_done_callback(self, fn):
+        """ call `fn` with this future once the operation is finished,
+        immediately if it's already finished. """
+        with self._lock:
+            if not self.done():
+                self._callbacks.append(fn)
+                return
+        self._call(fn)
+
+    def set_result(self, result):
+        self._result = result
+        self._set_done()
+
+    def set_exception(self, exc_value, exc_info=None):
+        if exc_info is None:
+            exc_info = (type(exc_value), exc_value, None)
+        self._exc_info = exc_info
+        self._set_done()
+
+    def _set_done(self):
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            self._call(fn)
+
+    def _call(self, fn):
+        # an error in a callback must not stop the thread finishing the
+        # operation
+        try:
+            fn(self)
+        except Exception:
+            logger.exception("error in the callback %r of a future" % fn)
+
+    def _wait(self, timeout):
+        self._event.wait(timeout)
+        if not self._event.isSet():
+            raise ResultTimeout("operation not finished after %ss" % timeout)
+
+
+def parallel_map(func, items, concurrency=DEFAULT_CONCURRENCY):
+    """ apply `func` to each item using at most `concurrency` threads
+    and return the results in the order of `items`.
+
+    If a call fails, remaining items aren't processed and the first
+    exception is raised again once all threads are done.
+    """
+    items = list(items)
+    if concurrency <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    results = [None] * len(items)
+    errors = []
+
+    queue = Queue()
+    for i, item in enumerate(items):
+        queue.put((i, item))
+
+    def worker():
+        while not errors:
+            try:
+                i, item = queue.get_nowait()
+            except Empty:
+                return
+
+            try:
+                results[i] = func(item)
+            except Exception:
+                errors.append(sys.exc_info())
+
+    threads = []
+    for i in range(min(concurrency, len(items))):
+        t = threading.Thread(target=worker)
+        t.daemon = True
+        t.start()
+        threads.append(t)
+
+    for t in threads:
+        t.join()
+
+    if errors:
+        exc_type, exc_value, tb = errors[0]
+        raise exc_type, exc_value, tb
+    return results
+
+
+class Executor(object):
+    """ pool of threads executing calls and returning futures. Threads
+    are started when needed, up to `max_workers`. """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._idle = 0
+        self._shutdown = False
+
+    def submit(self, fn, *args, **kwargs):
+        """ schedule `fn(*args, **kwargs)` and return a `Future` """
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("the executor is shut down")
+
+            self._queue.put((future, fn, args, kwargs))
+            # idle workers are the ones waiting for a call in the queue
+            if self._queue.qsize() > self._idle and \
+                    len(self._threads) < self.max_workers:
+                t = threading.Thread(target=self._worker)
+                t.daemon = True
+                t.start()
+                self._threads.append(t)
+        return future
+
+    def shutdown(self, wait=True):
+        """ stop the threads once the pending calls are executed """
+        with self._lock:
+            self._shutdown = True
+            for t in self._threads:
+                self._queue.put(None)
+        if wait:
+            for t in self._threads:
+                t.join()
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                self._idle += 1
+            item = self._queue.get()
+            with self._lock:
+                self._idle -= 1
+            if item is None:
+                return
+
+            future, fn, args, kwargs = item
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception, e:
+                future.set_exception(e, sys.exc_info())
+
+
+_STOP = object()
+
+
+def iter_in_background(iterable, max_pending=DEFAULT_MAX_PENDING):
+    """ consume `iterable` in a thread and yield its items. At most
+    `max_pending` items are read ahead. An exception raised by the
+    iterable is raised again by the generator.
+
+    Closing the generator stops the thread after the next item.
+    """
+    queue = Queue(max_pending)
+    stopped = []
+
+    def put(item):
+        while not stopped:
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except Exception:
+            put((_STOP, sys.exc_info()))
+        else:
+            put((_STOP, None))
+
+    t = threading.Thread(target=produce)
+    t.daemon = True
+    t.start()
+
+    try:
+        while True:
+            item, exc_info = queue.get()
+            if item is _STOP:
+                if exc_info is not None:
+                    exc_type, exc_value, tb = exc_info
+                    raise exc_type, exc_value, tb
+                return
+            yield item
+    finally:
+        stopped.append(True)
+
+
+class SingleFlight(object):
+    """ coalesce identical calls made concurrently. While a call for a key
+    is running, callers asking for the same key wait for its result
+    instead of making their own call.
+
+    Unless `copy` is False, each caller gets its own copy of a shared
+    result, made with `couchdbkit.cache.copy_json`. Otherwise the result
+    is shared and must not be modified.
+    """
+
+    def __init__(self, copy=True):
+        self.copy = copy
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    def stats(self):
+        """ return the number of calls made and of results shared """
+        return {"calls": self.calls, "shared": self.shared}
+
+    def do(self, key, fn, *args, **kwargs):
+        """ return the result of `fn(*args, **kwargs)`, or of the call
+        already running for `key` """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = [Future(), 0]
+                leader = True
+                self.calls += 1
+            else:
+                call[1] += 1
+                leader = False
+                self.shared += 1
+
+        future = call[0]
+        if leader:
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception, e:
+                future.set_exception(e, sys.exc_info())
+
+            with self._lock:
+                del self._calls[key]
+                followers = call[1]
+
+            if not followers:
+                # nobody else has seen the result
+                return future.result()
+
+        result = future.result()
+        if self.copy:
+            return copy_json(result)
+        return result
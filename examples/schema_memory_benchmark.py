@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -
+#
+# This file is part of couchdbkit released under the MIT license.
+# See the NOTICE for more information.
+
+"""
+Compare the memory used by the instances of Document, StaticDocument and
+CompactDocument::
+
+    python schema_memory_benchmark.py [-n 100000]
+
+`-n` documents are wrapped from JSON, like rows of a view, or built with
+the constructor, and the bytes held by each instance are printed. Bytes
+are counted by following the references of an instance, without the
+class and the objects shared between instances.
+
+CompactDocument instances keep the `__dict__` slot inherited from
+Document, but no dict is created for them: the saving comes from storing
+the values once, in the `_doc` slot.
+"""
+
+import datetime
+import gc
+import optparse
+import sys
+import types
+
+from couchdbkit import Document, StaticDocument, CompactDocument, \
+StringProperty, IntegerProperty, DateTimeProperty, ListProperty, \
+DictProperty
+from couchdbkit.utils import json_dumps, json_loads
+
+SHARED_TYPES = (type, types.ClassType, types.ModuleType, types.FunctionType,
+        types.BuiltinFunctionType)
+
+
+class Post(Document):
+    title = StringProperty()
+    author = StringProperty()
+    views = IntegerProperty()
+    created = DateTimeProperty()
+    tags = ListProperty()
+    meta = DictProperty()
+
+
+class StaticPost(StaticDocument):
+    title = StringProperty()
+    author = StringProperty()
+    views = IntegerProperty()
+    created = DateTimeProperty()
+    tags = ListProperty()
+    meta = DictProperty()
+
+
+class CompactPost(CompactDocument):
+    title = StringProperty()
+    author = StringProperty()
+    views = IntegerProperty()
+    created = DateTimeProperty()
+    tags = ListProperty()
+    meta = DictProperty()
+
+
+def make_json(i):
+    return json_dumps({
+        "_id": "post-%d" % i,
+        "_rev": "1-%032x" % i,
+        "title": "title of the post %d" % i,
+        "author": "author-%d" % (i % 100),
+        "views": i,
+        "created": "2012-01-01T10:00:00Z",
+        "tags": ["couchdb", "python"],
+        "meta": {"lang": "en"}
+    })
+
+
+def make_kwargs(i):
+    return dict(_id="post-%d" % i, title=u"title of the post %d" % i,
+            author=u"author-%d" % (i % 100), views=i,
+            created=datetime.datetime(2012, 1, 1, 10), tags=[u"couchdb",
+            u"python"], meta={u"lang": u"en"})
+
+
+def deep_size(obj, seen):
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, SHARED_TYPES):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return size
+
+
+def bench(cls, count, wrap):
+    # objects reachable from the class are shared by all the instances
+    seen = set()
+    deep_size(cls, seen)
+    deep_size(cls.__dict__, seen)
+    if wrap:
+        docs = [cls.wrap(json_loads(make_json(i))) for i in xrange(count)]
+    else:
+        docs = [cls(**make_kwargs(i)) for i in xrange(count)]
+
+    total = sum(deep_size(doc, seen) for doc in docs)
+    return total / float(count)
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option("-n", dest="count", type="int", default=100000,
+            help="number of documents per class")
+    options, args = parser.parse_args()
+
+    print "%-16s %-12s %14s" % ("class", "created by", "bytes/instance")
+    for cls in (Post, StaticPost, CompactPost):
+        for wrap in (True, False):
+            size = bench(cls, options.count, wrap)
+            print "%-16s %-12s %14.1f" % (cls.__name__,
+                    wrap and "wrap" or "constructor", size)
+
+
+if __name__ == "__main__":
+    main()
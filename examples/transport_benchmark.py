@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -
+#
+# This file is part of couchdbkit released under the MIT license.
+# See the NOTICE for more information.
+
+"""
+Compare the per-request overhead of the HTTP transports::
+
+    python transport_benchmark.py [-n 2000] [--unix-socket PATH] [URI]
+
+Each transport fetches the same small document `-n` times from a
+running CouchDB, on one connection kept alive, and the mean and
+percentile latencies are printed.
+"""
+
+import optparse
+import time
+
+from couchdbkit import Server
+from couchdbkit.transport import HTTPTransport, RestkitTransport, \
+UnixSocketTransport, Urllib3Transport
+
+DBNAME = "couchdbkit_transport_benchmark"
+DOCID = "doc"
+
+
+def transports(options):
+    yield "default", None
+    yield "restkit", RestkitTransport()
+    yield "http", HTTPTransport()
+    try:
+        yield "urllib3", Urllib3Transport()
+    except ImportError:
+        print "urllib3 isn't installed, skipped"
+    if options.unix_socket:
+        yield "unix", UnixSocketTransport(options.unix_socket)
+
+
+def bench(uri, transport, count):
+    db = Server(uri, transport=transport)[DBNAME]
+    # open the connection
+    db.open_doc(DOCID)
+
+    timings = []
+    for i in xrange(count):
+        start = time.time()
+        db.open_doc(DOCID)
+        timings.append(time.time() - start)
+    timings.sort()
+    return timings
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options] [URI]")
+    parser.add_option("-n", dest="count", type="int", default=2000,
+            help="number of requests per transport")
+    parser.add_option("--unix-socket", dest="unix_socket",
+            help="path of the unix socket CouchDB listens on")
+    options, args = parser.parse_args()
+    uri = args and args[0] or "http://127.0.0.1:5984"
+
+    db = Server(uri).get_or_create_db(DBNAME)
+    if not db.doc_exist(DOCID):
+        db.save_doc({"_id": DOCID, "value": "x" * 100})
+
+    try:
+        print "%-10s %10s %10s %10s" % ("transport", "mean (us)", "p50 (us)",
+                "p99 (us)")
+        for name, transport in transports(options):
+            timings = bench(uri, transport, options.count)
+            print "%-10s %10.1f %10.1f %10.1f" % (name,
+                    sum(timings) / len(timings) * 1e6,
+                    timings[len(timings) // 2] * 1e6,
+                    timings[int(len(timings) * 0.99)] * 1e6)
+    finally:
+        Server(uri).delete_db(DBNAME)
+
+
+if __name__ == "__main__":
+    main()
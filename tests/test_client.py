@@ -10,10 +10,23 @@ try:
 except ImportError:
     import unittest
 
+import threading
+import time
+
 from couchdbkit import (
-    BulkSaveError, CouchdbResource, Database, Document, ResourceNotFound,
-    ResourceConflict, Server
+    AsyncServer, BulkSaveError, ChangesStream, CouchdbResource, Database,
+    Document, DocumentCache, MultipleResultsFound, NoResultFound,
+    RequestAborted, ResourceNotFound, ResourceConflict, Server, ViewCache,
+    ViewResults
 )
+from couchdbkit.cluster import Cluster
+from couchdbkit.compression import GzipPolicy
+from couchdbkit.hedge import HedgePolicy, track_connection
+from couchdbkit.pool import CouchdbPool
+from couchdbkit.resource import JSONPayload
+from couchdbkit.transport import HTTPTransport
+from couchdbkit.utils import json_loads
+from couchdbkit.workers import Executor, SingleFlight
 
 
 class ClientServerTestCase(unittest.TestCase):
@@ -32,6 +45,146 @@ class ClientServerTestCase(unittest.TestCase):
         info = self.Server.info()
         self.assertIn('version', info)
 
+    def testCluster(self):
+        server = Server(['http://127.0.0.1:1', 'http://127.0.0.1:5984'])
+        server.cluster.eject_after = 1
+        self.assertIn('version', server.info())
+
+        db = server.create_db('couchdbkit_test')
+        doc = {'_id': 'test', 'string': 'test'}
+        db.save_doc(doc)
+        self.assertEqual(db.get('test')['string'], 'test')
+
+        stats = server.cluster.stats()
+        self.assertTrue(stats[0]['ejected'])
+        self.assertEqual(stats[0]['errors'], 1)
+        self.assertFalse(stats[1]['ejected'])
+        self.assertTrue(stats[1]['requests'] >= 4)
+
+    def testClusterEwma(self):
+        cluster = Cluster(['http://127.0.0.1:1', 'http://127.0.0.1:5984'],
+                strategy='ewma', eject_after=10)
+        failing, node = cluster.nodes
+        for i in range(3):
+            cluster.done(cluster.pick(exclude=[node]), 0.001, failed=True)
+            cluster.done(cluster.pick(exclude=[failing]), 0.05)
+        # the node failing fast isn't preferred
+        self.assertIs(cluster.pick(), node)
+
+    def testExecutorConcurrency(self):
+        executor = Executor(max_workers=4)
+        executor.submit(lambda: None).result()
+        running = []
+        peak = []
+        def task():
+            running.append(1)
+            peak.append(len(running))
+            time.sleep(0.05)
+            running.pop()
+        futures = [executor.submit(task) for i in range(12)]
+        for future in futures:
+            future.result(5)
+        executor.shutdown()
+        self.assertEqual(max(peak), 4)
+
+    def testPoolStats(self):
+        server = Server(pool_size=4, max_connections=2, warm_connections=2,
+                changes_pool=CouchdbPool())
+        stats = server.pool_stats()
+        self.assertEqual(stats['requests']['idle'], 2)
+        self.assertEqual(stats['requests']['connects'], 2)
+
+        db = server.create_db('couchdbkit_test')
+        threads = [threading.Thread(target=db.info) for i in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        stats = server.pool_stats()
+        self.assertEqual(stats['requests']['in_use'], 0)
+        self.assertEqual(stats['requests']['overflows'], 0)
+        self.assertTrue(stats['requests']['connects'] <= 4)
+
+        list(ChangesStream(db))
+        self.assertTrue(server.pool_stats()['changes']['connects'] >= 1)
+        self.assertIsNot(server.changes_pool, server.pool)
+
+    def testHedgedRequests(self):
+        policy = HedgePolicy(percentile=50, budget=0.5, min_delay=0,
+                min_samples=5)
+        server = Server(hedge=policy)
+        db = server.create_db('couchdbkit_test')
+        db.save_doc({'_id': 'test', 'string': 'test'})
+        for i in range(20):
+            self.assertEqual(db.get('test')['string'], 'test')
+        self.assertRaises(ResourceNotFound, db.get, 'missing')
+
+        stats = policy.stats()
+        self.assertTrue(stats['requests'] >= 21)
+        self.assertIsNotNone(stats['delay'])
+        self.assertTrue(stats['hedged'] <= stats['requests'] * 0.5)
+
+    def testHedgeAbortsSlowRequest(self):
+        policy = HedgePolicy(budget=1, min_delay=0.01, min_samples=5)
+        for i in range(5):
+            self.assertEqual(policy.call(lambda: "fast"), "fast")
+        self.assertEqual(policy.stats()['hedged'], 0)
+
+        aborted = threading.Event()
+        class FakeSocket(object):
+            def shutdown(self, how):
+                aborted.set()
+        class FakeConnection(object):
+            sock = FakeSocket()
+        calls = []
+        def send():
+            calls.append(threading.current_thread())
+            if len(calls) == 1:
+                track_connection(FakeConnection())
+                aborted.wait(5)
+                raise RequestAborted()
+            return "hedge"
+
+        start = time.time()
+        self.assertEqual(policy.call(send), "hedge")
+        self.assertTrue(time.time() - start < 1)
+        self.assertTrue(aborted.is_set())
+        self.assertIs(calls[0], threading.current_thread())
+        stats = policy.stats()
+        self.assertEqual(stats['hedged'], 1)
+        self.assertEqual(stats['hedge_wins'], 1)
+
+    def testHTTPTransport(self):
+        server = Server(transport=HTTPTransport())
+        db = server.create_db('couchdbkit_test')
+        db.save_doc({'_id': 'test', 'string': 'test'})
+        self.assertEqual(db.get('test')['string'], 'test')
+        self.assertTrue(db.doc_exist('test'))
+        self.assertRaises(ResourceNotFound, db.get, 'missing')
+        self.assertRaises(ResourceConflict, db.save_doc, {'_id': 'test'})
+        self.assertEqual(db.view('_all_docs').count(), 1)
+
+    def testGzip(self):
+        policy = GzipPolicy(compress_requests=True, threshold=1024)
+        server = Server(gzip=policy)
+        db = server.create_db('couchdbkit_test')
+        docs = [{'_id': 'doc%s' % i, 'string': 'test' * 10}
+                for i in range(100)]
+        db.save_docs(docs)
+        self.assertEqual(len(db.all_docs(include_docs=True).all()), 100)
+        self.assertEqual(db.get('doc1')['string'], 'test' * 10)
+
+        stats = policy.stats()
+        # CouchDB may refuse compressed requests. It doesn't compress its
+        # responses, they are tested with a fake transport in test_resource
+        self.assertTrue(stats['requests_compressed'] + stats['rejected'] > 0)
+
+        # streamed payloads are compressed too
+        docs = [{'_id': 'streamed%04d' % i} for i in range(1200)]
+        db.save_docs(docs)
+        self.assertEqual(len(db), 1300)
+
     def testCreateDb(self):
         res = self.Server.create_db('couchdbkit_test')
         self.assertIsInstance(res, Database)
@@ -82,6 +235,33 @@ class ClientServerTestCase(unittest.TestCase):
         self.assertNotEqual(uuid, uuid2)
         self.assertEqual(len(self.Server._uuids), 998)
 
+    def testLocalUUIDS(self):
+        server = Server(uuid_generator='random')
+        uuid = server.next_uuid()
+        self.assertEqual(len(uuid), 32)
+        self.assertNotEqual(uuid, server.next_uuid())
+        self.assertEqual(len(server._uuids), 0)
+
+        server = Server(uuid_generator='sequential')
+        uuids = [server.next_uuid() for i in range(100)]
+        self.assertEqual(uuids, sorted(uuids))
+        self.assertEqual(len(set(uuid[:26] for uuid in uuids)), 1)
+
+        server = Server(uuid_generator=lambda: 'test')
+        self.assertEqual(server.next_uuid(), 'test')
+        self.assertRaises(ValueError, Server, uuid_generator='unknown')
+
+    def testPrefetchUUIDS(self):
+        server = Server(uuid_batch_count=10, uuid_prefetch=5)
+        for i in range(6):
+            server.next_uuid()
+        # wait for the background refill
+        for i in range(50):
+            if len(server._uuids) > 4:
+                break
+            time.sleep(0.1)
+        self.assertEqual(len(server._uuids), 14)
+
 
 class ClientDatabaseTestCase(unittest.TestCase):
     def setUp(self):
@@ -138,6 +318,26 @@ class ClientDatabaseTestCase(unittest.TestCase):
         self.assertTrue(db.doc_exist('test'))
         del self.Server['couchdbkit/test']
 
+    def testSaveDocWithoutCopy(self):
+        db = self.Server.create_db('couchdbkit_test')
+        doc = {'_id': 'test', 'string': 'test'}
+        db.save_doc(doc, copy=False)
+        self.assertTrue(doc['_rev'].startswith('1-'))
+        self.assertEqual(db.get('test')['string'], 'test')
+
+        db.put_attachment(doc, 'test', 'a.txt', 'text/plain')
+        doc = db.get('test')
+        doc['string'] = 'test2'
+        db.save_doc(doc, copy=False)
+        self.assertTrue(doc['_attachments']['a.txt']['stub'])
+        self.assertEqual(db.fetch_attachment('test', 'a.txt'), 'test')
+
+        docs = [{'number': i} for i in range(10)]
+        db.save_docs(docs, copy=False)
+        self.assertTrue(all(doc['_rev'].startswith('1-') for doc in docs))
+        self.assertEqual(len(db), 11)
+        del self.Server['couchdbkit_test']
+
     def testUpdateDoc(self):
         db = self.Server.create_db('couchdbkit_test')
         doc = {'string': 'test', 'number': 4}
@@ -473,6 +673,86 @@ class ClientDatabaseTestCase(unittest.TestCase):
         self.assertEqual(doc['number'], 42)
         del self.Server['couchdbkit_test']
 
+    def testSaveMultipleDocsInChunks(self):
+        db = self.Server.create_db('couchdbkit_test')
+        docs = [{'string': 'test', 'number': i} for i in range(25)]
+        results = db.save_docs(docs, chunk_size=4, concurrency=3)
+        self.assertEqual(len(results), 25)
+        self.assertEqual(len(db), 25)
+        self.assertEqual([doc['_id'] for doc in docs],
+                [res['id'] for res in results])
+        self.assertTrue(all('_rev' in doc for doc in docs))
+
+        docs[10]['number'] = 42
+        db.save_docs(docs, max_bytes=200)
+        self.assertEqual(db.get(docs[10]['_id'])['number'], 42)
+
+        rev = docs[12]['_rev']
+        docs[12]['_rev'] = '1-bad'
+        try:
+            db.save_docs(docs, chunk_size=5)
+            self.fail("BulkSaveError not raised")
+        except BulkSaveError, e:
+            self.assertEqual(len(e.errors), 1)
+            self.assertEqual(len(e.results), 25)
+            self.assertEqual(e.errors[0]['id'], docs[12]['_id'])
+
+        self.assertRaises(ValueError, db.save_docs, docs, chunk_size=5,
+                all_or_nothing=True)
+
+        docs[12]['_rev'] = rev
+
+        db.delete_docs(docs[:20], chunk_size=6)
+        self.assertEqual(len(db), 5)
+        del self.Server['couchdbkit_test']
+
+    def testStreamedPayloads(self):
+        db = self.Server.create_db('couchdbkit_test')
+        docs = [{'_id': 'doc%04d' % i, 'number': i} for i in range(1200)]
+        results = db.save_docs(docs)
+        self.assertEqual(len(results), 1200)
+        self.assertEqual(len(db), 1200)
+
+        keys = [doc['_id'] for doc in docs]
+        self.assertEqual(len(db.all_docs(keys=keys).all()), 1200)
+        self.assertEqual(len(db.open_docs(keys, chunk_size=1200)), 1200)
+
+        payload = JSONPayload({'docs': [{'_id': 'sized'}]}, chunked=False)
+        db.res.post('_bulk_docs', payload=payload)
+        self.assertTrue(db.doc_exist('sized'))
+
+        db.delete_docs(docs)
+        self.assertEqual(len(db), 1)
+        del self.Server['couchdbkit_test']
+
+    def testBatchWriter(self):
+        db = self.Server.create_db('couchdbkit_test')
+        saved = []
+        with db.batch_writer(max_docs=3, max_delay=0.1) as writer:
+            futures = [writer.save({'number': i}) for i in range(7)]
+            writer.save({'_id': 'test'}, callback=saved.append)
+        self.assertEqual(len(db), 8)
+        result = futures[0].result()
+        self.assertIn('id', result)
+        self.assertIn('rev', result)
+        self.assertEqual(len(saved), 1)
+        self.assertEqual(saved[0].result()['id'], 'test')
+
+        writer = db.batch_writer(max_delay=0.05)
+        future = writer.save({'_id': 'test'})
+        self.assertRaises(ResourceConflict, future.result, 5)
+        writer.close()
+        self.assertRaises(ValueError, writer.save, {})
+
+        def fail(future):
+            raise ValueError("callback error")
+        with db.batch_writer(max_docs=2, max_bytes=100) as writer:
+            writer.save({'_id': 'test2'}, callback=fail)
+            futures = [writer.save({'number': i}) for i in range(5)]
+        self.assertEqual(len(db), 14)
+        self.assertTrue(all('rev' in f.result(5) for f in futures))
+        del self.Server['couchdbkit_test']
+
     def testDeleteMultipleDocs(self):
         db = self.Server.create_db('couchdbkit_test')
         docs = [
@@ -543,6 +823,83 @@ class ClientDatabaseTestCase(unittest.TestCase):
         self.assertNotEqual(doc33, docs3[3])
         del self.Server['couchdbkit_test']
 
+    def testOpenDocs(self):
+        db = self.Server.create_db('couchdbkit_test')
+        docs = [{'_id': 'test%s' % i, 'number': i} for i in range(10)]
+        db.save_docs(docs)
+        db.delete_doc('test3')
+
+        ids = ['test7', 'test1', 'missing', 'test3', 'test0', 'test9']
+        results = db.open_docs(ids, chunk_size=2, concurrency=3)
+        self.assertEqual(len(results), 6)
+        self.assertEqual([doc and doc['number'] for doc in results],
+                [7, 1, None, None, 0, 9])
+
+        results = db.open_docs(['test5'], wrapper=lambda doc: doc['_id'])
+        self.assertEqual(results, ['test5'])
+        self.assertEqual(db.open_docs([]), [])
+        del self.Server['couchdbkit_test']
+
+    def testDocumentCache(self):
+        cache = DocumentCache(max_bytes=1024)
+        db = self.Server.create_db('couchdbkit_test', cache=cache)
+        doc = {'_id': 'test', 'string': 'test'}
+        db.save_doc(doc)
+
+        doc1 = db.get('test')
+        self.assertEqual(cache.stats()['misses'], 1)
+        doc1['string'] = 'changed'
+        doc2 = db.get('test')
+        self.assertEqual(doc2['string'], 'test')
+        self.assertEqual(cache.stats()['revalidations'], 1)
+
+        doc2['string'] = 'test2'
+        db.save_doc(doc2)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(db.get('test')['string'], 'test2')
+        self.assertEqual(db.get('test', rev=doc['_rev'])['string'], 'test')
+
+        self.assertFalse(db.doc_exist('missing'))
+        self.assertFalse(db.doc_exist('missing'))
+        self.assertRaises(ResourceNotFound, db.get, 'missing')
+        self.assertEqual(cache.stats()['hits'], 3)
+        db.save_doc({'_id': 'missing'})
+        self.assertTrue(db.doc_exist('missing'))
+
+        db.save_doc({'_id': 'big', 'value': 'x' * 1024})
+        db.get('big')
+        self.assertNotIn((db.uri, 'big', None), cache._entries)
+        self.assertTrue(cache.size <= 1024)
+
+        # a cache shared by two databases keeps their documents apart
+        db2 = self.Server.create_db('couchdbkit_test2', cache=cache)
+        db2.save_doc({'_id': 'test', 'string': 'other'})
+        self.assertEqual(db.get('test')['string'], 'test2')
+        self.assertEqual(db2.get('test')['string'], 'other')
+        del self.Server['couchdbkit_test2']
+        del self.Server['couchdbkit_test']
+
+    def testSingleFlight(self):
+        flights = SingleFlight()
+        db = self.Server.create_db('couchdbkit_test', single_flight=flights)
+        db.save_doc({'_id': 'test', 'values': [1, 2]})
+
+        docs = []
+        threads = [threading.Thread(target=lambda: docs.append(db.get('test')))
+                for i in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(docs), 10)
+        self.assertEqual(len(set(id(doc) for doc in docs)), 10)
+        self.assertEqual(flights.calls + flights.shared, 10)
+        docs[0]['values'].append(3)
+        self.assertEqual(docs[1]['values'], [1, 2])
+        self.assertEqual(len(db.all_docs().all()), 1)
+        del self.Server['couchdbkit_test']
+
     def testCopy(self):
         db = self.Server.create_db('couchdbkit_test')
         doc = {'f': 'a'}
@@ -573,6 +930,28 @@ class ClientDatabaseTestCase(unittest.TestCase):
 
         del self.Server['couchdbkit_test']
 
+    def testAsyncDatabase(self):
+        with AsyncServer(self.Server, max_workers=4) as server:
+            db = server.create_db('couchdbkit_test').result()
+            futures = [db.save_doc({'_id': 'test%s' % i, 'number': i})
+                    for i in range(10)]
+            self.assertTrue(all(f.result()['ok'] for f in futures))
+
+            doc = db.open_doc('test3').result()
+            self.assertEqual(doc['number'], 3)
+            self.assertRaises(ResourceNotFound,
+                    db.open_doc('missing').result)
+
+            rows = list(db.all_docs(include_docs=True))
+            self.assertEqual(len(rows), 10)
+            self.assertEqual(db.all_docs().count().result(), 10)
+
+            changes = []
+            count = db.changes().each(changes.append).result()
+            self.assertEqual(count, 10)
+            self.assertEqual(len(list(db.changes())), 10)
+            server.delete_db('couchdbkit_test').result()
+
 
 class ClientViewTestCase(unittest.TestCase):
     def setUp(self):
@@ -820,6 +1199,171 @@ class ClientViewTestCase(unittest.TestCase):
         self.assertEqual(results[1].__class__, B)
         self.Server.delete_db('couchdbkit_test')
 
+    def testViewStream(self):
+        db = self.Server.create_db('couchdbkit_test')
+        docs = [{'_id': 'test%s' % i, 'number': i, 'docType': 'test'}
+                for i in range(10)]
+        db.save_docs(docs)
+
+        results = db.view('_all_docs', stream=True)
+        rows = list(results)
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows, db.view('_all_docs').all())
+        self.assertEqual(results.total_rows, 10)
+
+        results = db.view('_all_docs', include_docs=True, stream=True,
+                wrapper=lambda row: row['doc']['number'])
+        self.assertEqual(list(results.iterstream(chunk_size=16)), range(10))
+
+        # stop reading before the end of the response
+        for row in db.view('_all_docs', stream=True):
+            break
+        self.assertEqual(db.view('_all_docs').count(), 10)
+        del self.Server['couchdbkit_test']
+
+    def testViewPaginate(self):
+        db = self.Server.create_db('couchdbkit_test')
+        docs = [{'_id': 'test%02d' % i, 'tag': i % 2} for i in range(25)]
+        db.save_docs(docs)
+        design_doc = {
+            '_id': '_design/test',
+            'language': 'javascript',
+            'views': {
+                'by_tag': {
+                    'map': """function(doc) { if (doc.tag !== undefined) { emit(doc.tag, null); }}"""
+                }
+            }
+        }
+        db.save_doc(design_doc)
+
+        ids = [row['id'] for row in db.view('test/by_tag').paginate(4)]
+        self.assertEqual(ids, [row['id'] for row in db.view('test/by_tag')])
+        self.assertEqual(len(ids), 25)
+
+        rows = list(db.iterview('test/by_tag', batch=3, key=1))
+        self.assertEqual(len(rows), 12)
+
+        rows = list(db.iterview('test/by_tag', batch=4, limit=10))
+        self.assertEqual(len(rows), 10)
+
+        rows = list(db.iterview('_all_docs', batch=7, descending=True))
+        self.assertEqual(rows, db.all_docs(descending=True).all())
+        del self.Server['couchdbkit_test']
+
+    def testViewLimitedQueries(self):
+        db = self.Server.create_db('couchdbkit_test')
+        docs = [{'_id': 'test%s' % i, 'number': i} for i in range(5)]
+        db.save_docs(docs)
+
+        results = db.all_docs(include_docs=True)
+        self.assertEqual(results.first()['id'], 'test0')
+        self.assertEqual(results.total_rows, 5)
+        self.assertEqual(results.offset, 0)
+        self.assertTrue(results.exists())
+        self.assertTrue(results)
+        self.assertRaises(MultipleResultsFound, results.one)
+        # nothing has been cached by those calls
+        self.assertIsNone(results._result_cache)
+
+        self.assertEqual(db.all_docs(key='test3').one()['id'], 'test3')
+        self.assertEqual(db.all_docs(startkey='test2').offset, 2)
+        self.assertFalse(db.all_docs(key='nothing').exists())
+        self.assertIsNone(db.all_docs(key='nothing').one())
+        self.assertRaises(NoResultFound, db.all_docs(key='nothing').one,
+                except_all=True)
+
+        self.assertEqual(len(results), 5)
+        self.assertEqual(results.first()['doc']['number'], 0)
+        del self.Server['couchdbkit_test']
+
+    def testViewLimitedQueriesKept(self):
+        class FakeView(object):
+            _wrapper = None
+            def __init__(self, result):
+                self.result = result
+                self.queries = []
+            def _exec_json(self, **params):
+                self.queries.append(params)
+                limit = params.get('limit')
+                return dict(self.result,
+                        rows=self.result['rows'][:limit])
+
+        view = FakeView({'rows': [{'key': None, 'value': 3}], 'extra': 1})
+        results = ViewResults(view)
+        self.assertTrue(results)
+        self.assertTrue(results.exists())
+        self.assertEqual(len(view.queries), 1)
+        # a reduce view has no total_rows
+        self.assertEqual(results.total_rows, 1)
+        self.assertEqual(results.total_rows, 1)
+        self.assertEqual(len(view.queries), 2)
+        self.assertEqual(results._dynamic_keys, ['extra'])
+
+        # a grouped query is sent once
+        view = FakeView({'rows': [{'key': 'a', 'value': 2},
+            {'key': 'b', 'value': 1}]})
+        results = ViewResults(view, group=True)
+        self.assertEqual(results.total_rows, 2)
+        self.assertEqual(results.count(), 2)
+        self.assertEqual(len(view.queries), 1)
+        self.assertNotIn('limit', view.queries[0])
+
+    def testViewCache(self):
+        cache = ViewCache()
+        db = self.Server.create_db('couchdbkit_test', view_cache=cache)
+        design_doc = {
+            '_id': '_design/test',
+            'language': 'javascript',
+            'views': {
+                'count': {
+                    'map': """function(doc) { emit(doc.type, 1); }""",
+                    'reduce': "_sum"
+                }
+            }
+        }
+        db.save_doc(design_doc)
+        db.save_docs([{'type': 'a'}, {'type': 'b'}, {'type': 'a'}])
+
+        results = db.view('test/count', group=True).all()
+        self.assertEqual(results, [{'key': 'a', 'value': 2},
+            {'key': 'b', 'value': 1}])
+        self.assertEqual(cache.stats()['misses'], 1)
+
+        results[0]['value'] = 10
+        results = db.view('test/count', group=True).all()
+        self.assertEqual(results[0]['value'], 2)
+        self.assertEqual(cache.stats()['revalidations'], 1)
+
+        db.save_doc({'type': 'b'})
+        results = db.view('test/count', group=True).all()
+        self.assertEqual(results[1]['value'], 2)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+        self.assertEqual(db.view('test/count', keys=['b'],
+            group=True).first()['value'], 2)
+        self.assertEqual(len(cache), 2)
+        del self.Server['couchdbkit_test']
+
+    def testRawResponses(self):
+        db = self.Server.create_db('couchdbkit_test')
+        db.save_doc({'_id': 'test', 'string': 'test'})
+        db.save_doc({'_id': 'test2', 'string': 'test2 "]}'})
+
+        body = db.open_doc('test', raw=True)
+        self.assertIsInstance(body, str)
+        self.assertEqual(json_loads(body)['string'], 'test')
+        with db.open_doc('test', raw='stream') as f:
+            self.assertEqual(json_loads(f.read())['_id'], 'test')
+
+        body = db.all_docs(include_docs=True, raw=True)
+        self.assertEqual(len(json_loads(body)['rows']), 2)
+
+        rows = list(db.all_docs(include_docs=True, raw='rows'))
+        self.assertTrue(all(isinstance(row, str) for row in rows))
+        self.assertEqual([json_loads(row)['doc']['string'] for row in rows],
+                ['test', 'test2 "]}'])
+        del self.Server['couchdbkit_test']
+
 
 if __name__ == '__main__':
     unittest.main()
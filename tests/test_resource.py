@@ -10,8 +10,20 @@ try:
 except ImportError:
     import unittest
 
+import datetime
+from StringIO import StringIO
+import zlib
+
 from restkit.errors import RequestFailed, RequestError
-from couchdbkit.resource import CouchdbResource
+from restkit.filters import BasicAuth
+from restkit.wrappers import Request
+from couchdbkit import utils
+from couchdbkit.cache import DocumentCache, ViewCache
+from couchdbkit.cluster import Cluster, ClusterResource
+from couchdbkit.compression import GzipPolicy, GzipReader, compress
+from couchdbkit.client import Server
+from couchdbkit.resource import CouchdbResource, JSONPayload
+from couchdbkit.transport import TransportResponse
 
 
 class ServerTestCase(unittest.TestCase):
@@ -50,7 +62,174 @@ class ServerTestCase(unittest.TestCase):
     def testRequestFailed(self):
         bad = CouchdbResource('http://localhost:10000')
         self.assertRaises(RequestError, bad.get)
-        
+
+
+class JSONCodecTestCase(unittest.TestCase):
+    def tearDown(self):
+        utils.set_json_codec()
+
+    def testCodecs(self):
+        doc = {'string': u'\xe9t\xe9', 'int': 1, 'list': [1.5, None, True],
+                'date': datetime.datetime(2012, 1, 2, 3, 4, 5, 6)}
+        for name, codec_class in utils.JSON_CODECS:
+            if not codec_class:
+                continue
+            utils.set_json_codec(name)
+            data = utils.json_dumps(doc)
+            self.assertIsInstance(data, str)
+            result = utils.json_loads(data)
+            self.assertEqual(result['string'], doc['string'])
+            self.assertEqual(result['list'], doc['list'])
+            self.assertEqual(result['date'], '2012-01-02T03:04:05Z')
+            self.assertEqual(utils.json_loads(data.decode('utf-8')), result)
+        self.assertRaises(TypeError, utils.json_dumps, object())
+        self.assertRaises(ValueError, utils.set_json_codec, 'unknown')
+
+class FakeConnection(object):
+
+    def release(self, should_close=False):
+        pass
+
+
+class FakeTransport(object):
+    """ transport answering the requests with the given responses """
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def request(self, url, method='GET', body=None, headers=None,
+            filters=None):
+        request = Request(url, method=method, body=body, headers=headers)
+        for f in filters or ():
+            f.on_request(request)
+        self.requests.append(request)
+
+        status, resp_headers, resp_body = self.responses.pop(0)
+        response = TransportResponse(FakeConnection(), request, status,
+                "Reason", resp_headers, StringIO(resp_body).read, False)
+        for f in filters or ():
+            if hasattr(f, 'on_response'):
+                f.on_response(response, request)
+        return response
+
+
+class ClusterTestCase(unittest.TestCase):
+
+    def testHealthCheckOptions(self):
+        transport = FakeTransport([(200,
+            [('Content-Type', 'application/json')], '{"couchdb":"Welcome"}')])
+        cluster = Cluster(['http://127.0.0.1:5984', 'http://127.0.0.1:5985'])
+        ClusterResource(cluster.uri, cluster=cluster, transport=transport,
+                filters=[BasicAuth('user', 'pass')])
+
+        node = cluster.nodes[1]
+        self.assertTrue(cluster.health_check(node))
+        request = transport.requests[0]
+        self.assertEqual(request.url, 'http://127.0.0.1:5985')
+        self.assertTrue(request.headers.iget('authorization')
+                .startswith('Basic '))
+
+
+class SharedCacheTestCase(unittest.TestCase):
+
+    def response(self, body, etag):
+        return (200, [('Content-Type', 'application/json'),
+            ('ETag', etag)], utils.json_dumps(body))
+
+    def testSharedDocumentCache(self):
+        transport = FakeTransport([
+            self.response({'_id': 'test', 'db': 1}, '"1-a"'),
+            self.response({'_id': 'test', 'db': 2}, '"1-b"')])
+        server = Server(transport=transport)
+        cache = DocumentCache()
+        db1 = server.get_db('db1', cache=cache)
+        db2 = server.get_db('db2', cache=cache)
+        self.assertEqual(db1.get('test')['db'], 1)
+        self.assertEqual(db2.get('test')['db'], 2)
+        self.assertEqual(len(cache), 2)
+
+    def testSharedViewCache(self):
+        transport = FakeTransport([
+            self.response({'total_rows': 1, 'rows': [{'key': 1}]}, '"a"'),
+            self.response({'total_rows': 1, 'rows': [{'key': 2}]}, '"b"')])
+        server = Server(transport=transport)
+        cache = ViewCache()
+        db1 = server.get_db('db1', view_cache=cache)
+        db2 = server.get_db('db2', view_cache=cache)
+        self.assertEqual(db1.view('_all_docs').first()['key'], 1)
+        self.assertEqual(db2.view('_all_docs').first()['key'], 2)
+        self.assertEqual(len(cache), 2)
+
+
+class GzipTestCase(unittest.TestCase):
+
+    def testGzipReader(self):
+        data = utils.json_dumps({'rows': [{'id': 'doc%d' % i}
+            for i in range(1000)]})
+        policy = GzipPolicy()
+        reader = GzipReader(StringIO(compress(data)), policy, chunk_size=512)
+        chunks = iter(lambda: reader.read(100), '')
+        self.assertEqual("".join(chunks), data)
+        stats = policy.stats()
+        self.assertEqual(stats['response_bytes'], len(data))
+        self.assertEqual(stats['response_bytes_received'],
+                len(compress(data)))
+
+    def testDecompressResponse(self):
+        body = utils.json_dumps({'ok': True, 'data': 'test' * 1000})
+        transport = FakeTransport([(200, [
+            ('Content-Type', 'application/json'),
+            ('Content-Encoding', 'gzip')], compress(body))])
+        policy = GzipPolicy()
+        res = CouchdbResource(transport=transport, gzip=policy)
+        self.assertEqual(res.get('db').json_body['data'], 'test' * 1000)
+        self.assertEqual(transport.requests[0].headers.iget(
+            'accept-encoding'), 'gzip')
+        stats = policy.stats()
+        self.assertEqual(stats['responses_compressed'], 1)
+        self.assertTrue(stats['response_ratio'] < 1)
+
+    def testRejectedCompression(self):
+        transport = FakeTransport([
+            (415, [('Content-Type', 'application/json')],
+                '{"error":"unsupported_media_type"}'),
+            (201, [('Content-Type', 'application/json')], '{"ok":true}')])
+        policy = GzipPolicy(compress_requests=True, threshold=100)
+        res = CouchdbResource(transport=transport, gzip=policy)
+        doc = {'_id': 'test', 'data': 'test' * 100}
+        self.assertTrue(res.post('db', payload=doc).json_body['ok'])
+
+        first, second = transport.requests
+        self.assertEqual(first.headers.iget('content-encoding'), 'gzip')
+        self.assertIsNone(second.headers.iget('content-encoding'))
+        self.assertEqual(utils.json_loads(second.body), doc)
+        self.assertFalse(policy.compress_requests)
+        self.assertEqual(policy.stats()['rejected'], 1)
+
+    def testCompressStreamedPayload(self):
+        policy = GzipPolicy(compress_requests=True)
+        obj = {'docs': [{'_id': 'doc%d' % i} for i in range(1000)]}
+        payload = JSONPayload(obj)
+        request = Request('http://127.0.0.1:5984/db/_bulk_docs', 'POST',
+                payload, payload.headers())
+        policy.on_request(request)
+        self.assertEqual(request.headers.iget('content-encoding'), 'gzip')
+        self.assertEqual(request.headers.iget('content-type'),
+                'application/json')
+        self.assertIsNone(request.headers.iget('content-length'))
+
+        # the body can be read again, as it's done when a request is retried
+        for i in range(2):
+            request.body.seek(0)
+            chunks = iter(lambda: request.body.read(4096), '')
+            body = zlib.decompress("".join(chunks), 16 + zlib.MAX_WBITS)
+            self.assertEqual(utils.json_loads(body), obj)
+        stats = policy.stats()
+        self.assertEqual(stats['requests_compressed'], 1)
+        self.assertTrue(stats['request_ratio'] < 1)
+
+
 if __name__ == '__main__':
     unittest.main()
 
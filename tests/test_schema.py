@@ -13,6 +13,7 @@ except ImportError:
     import unittest
 
 from couchdbkit import *
+from couchdbkit.utils import json_loads
 
 
 
@@ -154,6 +155,71 @@ class DocumentTestCase(unittest.TestCase):
 
         self.server.delete_db('couchdbkit_test')
 
+    def testGetChanges(self):
+        class Test(Document):
+            a = StringProperty()
+            b = StringProperty()
+            tags = ListProperty()
+
+        doc = Test.wrap({'_id': u'x', '_rev': u'1-a', 'a': u'hi'})
+        self.assert_(doc._snapshot is None)
+
+        Test._track_changes = True
+        doc = Test.wrap({'_id': u'x', '_rev': u'1-a', 'a': u'hi'})
+        self.assert_(doc.get_changes() == {})
+        self.assert_(doc.is_unchanged())
+        doc.tags.append(u'test')
+        doc.b = u'b'
+        self.assert_(doc.get_changes() == {'tags': ([], [u'test']),
+            'b': (None, u'b')})
+        self.assert_(not doc.is_unchanged())
+
+    def testSaveUnchanged(self):
+        db = self.server.create_db('couchdbkit_test')
+        class Test(Document):
+            _track_changes = True
+            string = StringProperty()
+            l = ListProperty()
+            i = IntegerProperty(required=True)
+        Test._db = db
+
+        doc = Test(string="test", i=1)
+        self.assert_(doc.get_changes()["string"] == (None, u"test"))
+        doc.save()
+        rev = doc._rev
+        self.assert_(doc.is_unchanged())
+        doc.save()
+        self.assert_(doc._rev == rev)
+
+        doc1 = Test.get(doc._id)
+        self.assert_(doc1.get_changes() == {})
+        doc1.save()
+        self.assert_(db.get(doc._id)['_rev'] == rev)
+        doc1.save(force=True)
+        self.assert_(doc1._rev != rev)
+
+        doc1.l.append(1)
+        self.assert_(doc1.get_changes() == {"l": ([], [1])})
+        doc1.save()
+        self.assert_(db.get(doc._id)['l'] == [1])
+
+        # only the changed properties are validated
+        db.save_doc({"_id": "test2", "doc_type": "Test", "string": "test"})
+        doc2 = Test.get("test2")
+        doc2.string = "test2"
+        doc2.save()
+        self.assert_(db.get("test2")["string"] == "test2")
+
+        docs = [Test.get(doc._id), Test.get("test2")]
+        docs[1].string = "test3"
+        revs = [d._rev for d in docs]
+        Test.save_docs(docs)
+        self.assert_(docs[0]._rev == revs[0])
+        self.assert_(docs[1]._rev != revs[1])
+        self.assert_(docs[1].is_unchanged())
+
+        self.server.delete_db('couchdbkit_test')
+
     def testBulkSave(self):
         db = self.server.create_db('couchdbkit_test')
         class Test(Document):
@@ -231,6 +297,25 @@ class DocumentTestCase(unittest.TestCase):
 
         self.server.delete_db('couchdbkit_test')
 
+    def testGetMany(self):
+        db = self.server.create_db('couchdbkit_test')
+        class Test(Document):
+            string = StringProperty()
+        Test._db = db
+
+        docs = [Test(string="test%s" % i) for i in range(5)]
+        Test.bulk_save(docs)
+
+        ids = [doc._id for doc in reversed(docs)] + ['missing']
+        results = Test.get_many(ids, chunk_size=2)
+        self.assert_(len(results) == 6)
+        self.assert_(results[-1] is None)
+        self.assert_(isinstance(results[0], Test) == True)
+        self.assert_([doc.string for doc in results[:-1]] ==
+                ["test4", "test3", "test2", "test1", "test0"])
+
+        self.server.delete_db('couchdbkit_test')
+
     def testLoadDynamicProperties(self):
         db = self.server.create_db('couchdbkit_test')
         class Test(Document):
@@ -330,6 +415,185 @@ class DocumentTestCase(unittest.TestCase):
         self.assert_('s' in b1._doc['a'])
         self.assert_(b1.a.s == "test")
 
+    def testCompiledWrap(self):
+        class A(DocumentSchema):
+            s = StringProperty()
+
+        class TestDoc(Document):
+            s = StringProperty()
+            i = IntegerProperty()
+            f = FloatProperty()
+            b = BooleanProperty(default=True)
+            dt = DateTimeProperty()
+            d = DateProperty()
+            l = ListProperty()
+            sl = StringListProperty()
+            dec = DecimalProperty()
+            ch = StringProperty(choices=['x', 'y'])
+            a = SchemaProperty(A)
+            other = StringProperty(name="renamed")
+
+        class TestDoc2(TestDoc):
+            def __init__(self, *args, **kwargs):
+                super(TestDoc2, self).__init__(*args, **kwargs)
+                self._wrapped = True
+
+        self.assert_(TestDoc._compiled_wrap is not None)
+        self.assert_(TestDoc2._compiled_wrap is None)
+
+        def data():
+            return {"_id": u"test", "_rev": u"1-a", "doc_type": u"TestDoc",
+                    "s": u"test", "i": 2.5, "f": 2, "b": None,
+                    "dt": u"2010-01-01T10:20:30.123Z", "d": u"2010-01-02",
+                    "l": [1, {"a": u"2010-01-02"}], "sl": [u"a"],
+                    "dec": u"1.50", "ch": u"x", "a": {"s": u"a"},
+                    "renamed": u"b", "dynamic": u"2010-01-02"}
+
+        doc = TestDoc.wrap(data())
+        doc1 = TestDoc._generic_wrap(data())
+        self.assert_(doc.to_json() == doc1.to_json())
+        self.assert_(doc._doc["i"] == 2)
+        self.assert_(doc._doc["f"] == 2.0)
+        self.assert_(doc._doc["b"] is True)
+        self.assert_(doc._doc["dt"] == u"2010-01-01T10:20:30Z")
+        self.assert_(doc.dt == datetime.datetime(2010, 1, 1, 10, 20, 30))
+        self.assert_(doc.d == datetime.date(2010, 1, 2))
+        self.assert_(doc.a.s == u"a")
+        self.assert_(doc.other == u"b")
+        self.assert_(doc.dynamic == datetime.date(2010, 1, 2))
+        self.assert_(doc.dynamic_properties() == doc1.dynamic_properties())
+
+        self.assertRaises(BadValueError, TestDoc.wrap, {"ch": u"z"})
+        self.assertRaises(BadValueError, TestDoc.wrap, {"sl": [1]})
+
+        doc2 = TestDoc2.wrap(data())
+        self.assert_(doc2._wrapped)
+        self.assert_(doc2.to_json() == doc1.to_json())
+
+    def testCompiledWrapDecodedJson(self):
+        class TestDoc(Document):
+            s = StringProperty()
+            dt = DateTimeProperty()
+            d = DateProperty()
+            t = TimeProperty()
+
+        data = json_loads('{"doc_type": "TestDoc", "s": "test", '
+                '"dt": "2010-01-01T10:20:30Z", "d": "2010-01-02", '
+                '"t": "10:20:30"}')
+        self.assert_(type(data["s"]) is str)
+        values = dict(data)
+        doc = TestDoc.wrap(data)
+        # values already in their JSON form are kept as they are
+        for name in ("s", "dt", "d", "t"):
+            self.assert_(doc._doc[name] is values[name])
+        self.assert_(doc.s == u"test")
+        self.assert_(type(doc.s) is unicode)
+        self.assert_(doc.dt == datetime.datetime(2010, 1, 1, 10, 20, 30))
+        self.assert_(doc.d == datetime.date(2010, 1, 2))
+        self.assert_(doc.t == datetime.time(10, 20, 30))
+        self.assert_(doc.to_json() == TestDoc._generic_wrap(
+            json_loads('{"doc_type": "TestDoc", "s": "test", '
+                '"dt": "2010-01-01T10:20:30Z", "d": "2010-01-02", '
+                '"t": "10:20:30"}')).to_json())
+
+    def testLazyWrap(self):
+        class A(DocumentSchema):
+            s = StringProperty()
+
+        class TestDoc(Document):
+            _lazy_wrap = True
+            dt = DateTimeProperty()
+            i = IntegerProperty(default=1)
+            a = SchemaProperty(A)
+
+        data = {"_id": u"test", "doc_type": u"TestDoc",
+                "dt": u"2010-01-01T10:20:30.123Z", "a": {"s": u"a"}}
+        doc = TestDoc.wrap(data)
+        self.assert_(doc.to_json() is data)
+        self.assert_(data["dt"] == u"2010-01-01T10:20:30.123Z")
+        self.assert_(data["i"] == 1)
+
+        self.assert_(doc.dt == datetime.datetime(2010, 1, 1, 10, 20, 30))
+        self.assert_(doc.dt is doc.dt)
+        self.assert_(doc.a is doc.a)
+        doc.a.s = u"b"
+        self.assert_(data["a"]["s"] == u"b")
+
+        doc.dt = datetime.datetime(2011, 1, 1)
+        self.assert_(doc.dt == datetime.datetime(2011, 1, 1))
+        self.assert_(data["dt"] == u"2011-01-01T00:00:00Z")
+        data["dt"] = u"2012-01-01T00:00:00Z"
+        self.assert_(doc.dt == datetime.datetime(2012, 1, 1))
+
+    def testCompactDocument(self):
+        import copy
+
+        class TestDoc(CompactDocument):
+            s = StringProperty()
+            l = ListProperty()
+
+        class TestDoc2(TestDoc):
+            i = IntegerProperty(default=1)
+
+        self.assert_(TestDoc2.__slots__ == ())
+        self.assert_('_doc' in CompactDocument.__slots__)
+
+        data = {"_id": u"test", "doc_type": u"TestDoc2", "s": u"a",
+                "l": [1], "extra": u"b"}
+        doc = TestDoc2.wrap(data)
+        self.assert_(doc._doc is data)
+        self.assert_(doc.s == u"a")
+        self.assert_(doc.i == 1)
+        doc.l.append(2)
+        self.assert_(data["l"] == [1, 2])
+        self.assert_(doc.dynamic_properties() == {})
+        self.assert_(doc.to_json()["extra"] == u"b")
+
+        def set_dynamic():
+            doc.foo = u"bar"
+        self.assertRaises(AttributeError, set_dynamic)
+        self.assertRaises(AttributeError, TestDoc2, foo=u"bar")
+
+        doc2 = copy.deepcopy(doc)
+        self.assert_(doc2.to_json() == doc.to_json())
+        doc3 = TestDoc2(s=u"c")
+        self.assert_(doc3._doc["s"] == u"c")
+        self.assert_(doc3._doc["i"] == 1)
+
+    def testInferTypes(self):
+        from couchdbkit.schema.properties import value_to_python
+
+        self.assert_(value_to_python(u"2010-01-02") ==
+                datetime.date(2010, 1, 2))
+        self.assert_(value_to_python(u"2010-01-02T10:20:30.123+01:00") ==
+                datetime.datetime(2010, 1, 2, 10, 20, 30))
+        self.assert_(value_to_python(u"10:20:30") == datetime.time(10, 20, 30))
+        self.assert_(value_to_python(u"1.50") == decimal.Decimal("1.50"))
+        # taken for a time
+        self.assert_(value_to_python(u"12.30") == u"12.30")
+        self.assert_(value_to_python(u"12.30", item_type=decimal.Decimal) ==
+                decimal.Decimal("12.30"))
+        self.assert_(value_to_python(u"2010-02-30") == u"2010-02-30")
+        self.assert_(value_to_python(u"2010-01-02",
+            item_type=datetime.datetime) == u"2010-01-02")
+        self.assert_(value_to_python([u"hello", {"a": u"10:20:30"}]) ==
+                [u"hello", {"a": datetime.time(10, 20, 30)}])
+
+        class TestDoc(Document):
+            _infer_types = False
+
+        class TestDoc2(Document):
+            _infer_types = ["d"]
+
+        data = {"d": u"2010-01-02", "d2": u"2010-01-02", "l": [u"1.50"]}
+        doc = TestDoc.wrap(dict(data))
+        self.assert_(doc.d == u"2010-01-02")
+        self.assert_(doc.l == [u"1.50"])
+        self.assert_(doc._doc["l"] == [u"1.50"])
+        doc2 = TestDoc2.wrap(dict(data))
+        self.assert_(doc2.d == datetime.date(2010, 1, 2))
+        self.assert_(doc2.d2 == u"2010-01-02")
+
     def testView(self):
         class TestDoc(Document):
             field1 = StringProperty()